@@ -0,0 +1,179 @@
+"""Building blocks of a document analysis, shared by the app and the batch runner"""
+import os
+import threading
+from collections import OrderedDict
+from extraction import INLINE_DOCUMENT_MAX_CHARS, is_document
+
+# Data files are analyzed with code_interpreter, everything else is searched with file_search
+DATA_FILE_EXTENSIONS = (".csv", ".xlsx")
+# Data files larger than this are described by their local summary alone, without uploading them
+DATA_SUMMARY_ONLY_BYTES = 20 * 1024 * 1024
+# Summaries kept in memory by content hash, so re-analyzing a file doesn't parse it again
+SUMMARY_CACHE_SIZE = 128
+# Text of small documents inlined into one message, larger or further documents are uploaded
+INLINE_TOTAL_MAX_CHARS = 40_000
+
+# Closing part of the run instructions of every document analysis
+ANALYSIS_INSTRUCTIONS = """
+                Please provide a comprehensive evaluation of the attached startup proposal.
+                Follow the structure below and ensure each bullet is explained in multiple sentences or paragraphs:
+
+                1. Summary of the proposal (Use proposal summary or pitch deck)
+                2. Strengths (Use proposal summary or pitch deck)
+                3. Areas for improvement
+                4. Team assessment (with LinkedIn profiles and a detailed table of team members if CVs are provided)
+                5. Competitive analysis
+                6. Overall score (1-10)
+                7. Final recommendation
+
+                At the end, always provide a Team Table with columns:
+                - Experience Summary
+                - Contact Details from CV
+
+                Remember to reference all attached files (PDFs, CSVs, etc.) during the analysis.
+                """
+
+def is_data_file(file_name):
+    return file_name.lower().endswith(DATA_FILE_EXTENSIONS)
+
+summary_lock = threading.Lock()
+summary_cache = OrderedDict()
+
+def summarize_data_file(file_name, file, digest):
+    """Text summary of a data file, computed once per content hash; None if it can't be read"""
+    with summary_lock:
+        if digest in summary_cache:
+            summary_cache.move_to_end(digest)
+            return summary_cache[digest]
+    # Imported here so the app doesn't load pandas until a data file is analyzed
+    from data_summary import summarize_data_file as summarize, format_summary
+    try:
+        file.seek(0)
+        summary = format_summary(file_name, summarize(file_name, file))
+    except Exception as e:
+        print(f"Could not summarize {file_name}: {e}")
+        return None
+    finally:
+        file.seek(0)
+    with summary_lock:
+        summary_cache[digest] = summary
+        while len(summary_cache) > SUMMARY_CACHE_SIZE:
+            summary_cache.popitem(last=False)
+    return summary
+
+def summarize_data_files(pending):
+    """Summarize the data files among (file_name, file, digest) items before they are uploaded
+
+    Returns the items that still need uploading, and {digest: {"file_name", "summary"}} for
+    the data files. Files over DATA_SUMMARY_ONLY_BYTES are left out of the uploads, their
+    summary stands in for them.
+    """
+    uploads, summaries = [], {}
+    for file_name, file, digest in pending:
+        summary = summarize_data_file(file_name, file, digest) if is_data_file(file_name) else None
+        if summary:
+            summaries[digest] = {"file_name": file_name, "summary": summary}
+            file.seek(0, os.SEEK_END)
+            too_large = file.tell() > DATA_SUMMARY_ONLY_BYTES
+            file.seek(0)
+            if too_large:
+                continue
+        uploads.append((file_name, file, digest))
+    return uploads, summaries
+
+def prepare_files(pending, extraction_cache):
+    """Summarize data files and extract small documents before anything is uploaded
+
+    Returns the items that still need uploading, and {digest: {"file_name", "summary"}}
+    for data files or {digest: {"file_name", "text"}} for documents small enough to be
+    sent in the message instead of being uploaded and indexed.
+    """
+    uploads, extras = summarize_data_files(pending)
+    remaining, budget = [], INLINE_TOTAL_MAX_CHARS
+    for file_name, file, digest in uploads:
+        if is_document(file_name) and budget > 0:
+            text = extraction_cache.document_text(file_name, file, digest, min(INLINE_DOCUMENT_MAX_CHARS, budget))
+            if text:
+                extras[digest] = {"file_name": file_name, "text": text}
+                budget -= len(text)
+                continue
+        remaining.append((file_name, file, digest))
+    return remaining, extras
+
+def split_files(files):
+    """Split {"file_id", "file_name"} dicts into (data files, documents)
+
+    Data files described by a summary alone and documents sent as text have no file id.
+    """
+    data_files = [f for f in files if is_data_file(f["file_name"])]
+    documents = [f for f in files if not is_data_file(f["file_name"])]
+    return data_files, documents
+
+def build_analysis_request(files, proposal_text=None):
+    """Build the message text, attachments and run instructions for analyzing uploaded files
+
+    Only the data files are attached to the message; the documents must already be
+    indexed in the thread's vector store so file_search can find them. Files with a
+    "summary" or "text" have it included in message_text, which is what the model gets;
+    display_text only names the files, for the transcript.
+    """
+    data_files, _ = split_files(files)
+    uploaded_data_files = [f for f in data_files if f["file_id"]]
+    summary_only = [f for f in data_files if not f["file_id"]]
+    summaries = [f["summary"] for f in files if f.get("summary")]
+    inline_documents = [f for f in files if f.get("text")]
+    file_names = [f["file_name"] for f in files if f["file_id"]]
+
+    # Create attachments list for data files that need code_interpreter
+    attachments = [
+        {"file_id": f["file_id"], "tools": [{"type": "code_interpreter"}]}
+        for f in uploaded_data_files
+    ]
+
+    message_text = f"{proposal_text}\n\n" if proposal_text else ""
+    if file_names:
+        message_text += f"I've uploaded {len(file_names)} files for analysis: {', '.join(file_names)}. "
+    if uploaded_data_files:
+        message_text += f"The following are data files that need code_interpreter: {', '.join(f['file_name'] for f in uploaded_data_files)}. "
+    if summary_only:
+        message_text += f"These data files were too large to upload and are described by their summaries below: {', '.join(f['file_name'] for f in summary_only)}. "
+    if inline_documents:
+        message_text += f"These documents are included in full below: {', '.join(f['file_name'] for f in inline_documents)}. "
+    message_text += "Please analyze all files together for a comprehensive evaluation."
+    for summary in summaries:
+        message_text += f"\n\n{summary}"
+    for document in inline_documents:
+        message_text += f"\n\n{document['text']}"
+
+    display_text = f"{proposal_text}\n\n" if proposal_text else ""
+    display_text += f"I've uploaded {len(files)} files for analysis: {', '.join(f['file_name'] for f in files)}."
+
+    has_csv = bool(data_files)
+    has_pdf = any(f["file_name"].lower().endswith('.pdf') for f in files)
+
+    # Build dynamic instructions
+    instructions = "Please analyze all the uploaded files together to provide a comprehensive evaluation. "
+    if summaries:
+        # Describing the data in the sandbox is what makes data-heavy runs slow
+        instructions += (
+            "The message includes summaries of the data files computed from every row; rely on them for "
+            "the overview of the data and only use the code_interpreter tool for analysis they don't cover. "
+        )
+    elif uploaded_data_files:
+        instructions += "For CSV files, use the code_interpreter tool to analyze the data. "
+    if inline_documents:
+        # Searching is only worth it for documents too long to include
+        instructions += "Read the documents included in the message directly; use file_search only for the uploaded documents. "
+    if has_pdf and has_csv:
+        instructions += "Use both the business plan in the PDF and analyze the competitive data in the CSV files. "
+    instructions += (
+        "Use your VC evaluation framework and the configured functions to evaluate the startup proposal. "
+    )
+    instructions += ANALYSIS_INSTRUCTIONS
+
+    return {
+        "message_text": message_text,
+        "display_text": display_text,
+        "instructions": instructions,
+        "attachments": attachments
+    }
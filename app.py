@@ -1,128 +1,269 @@
 import streamlit as st
-import time
 import os
+import time
+import uuid
 from openai import OpenAI
-from utils import create_assistant, create_thread, create_message, get_response
+from utils import create_assistant, create_thread, create_message, function_tool_names, stream_response, RunWatcher, ACTIVE_RUN_STATUSES
+from uploads import UploadIndex, hash_content, upload_files
+from vector_stores import ThreadVectorStore
+from history import ThreadHistory
+from eval_cache import EvaluationCache, evaluation_key
+from single_flight import SingleFlight
+from instrumentation import Tracer, InstrumentedClient
+from background import EvaluationJob, JobRunner
+from analysis import build_analysis_request, prepare_files, split_files
+from extraction import ExtractionCache
+from rate_limits import RateLimitedClient, TokenBucket
+from routing import ASSISTANT_TIERS, LatencyStats, ModelRouter, tier_setting
+from context import (TRUNCATION_STRATEGY, context_tokens, needs_rollover, rebuild_transcript, seed_thread,
+                     split_context, start_thread, thread_chain)
 import json
-import speech_recognition as sr
-
-def transcribe_speech():
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        st.write("Speak something...")
-        audio_data = r.listen(source)
-        return r.recognize_google(audio_data)
 # Set page configuration
 st.set_page_config(page_title="VC Assistant", layout="wide")
 # File to store IDs
 # STORAGE_FILE = "assistant_data.json"
-# Initialize API client
-OPENAI_API_KEY = st.secrets["openai_api_key"]
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 # File to store IDs - use absolute path
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STORAGE_FILE = os.path.join(BASE_DIR, "assistant_data.json")
 
+# Number of most recent messages always rendered in full
+TRANSCRIPT_WINDOW = 10
+
+# How long a verified assistant is trusted before it is retrieved again
+ASSISTANT_VERIFY_TTL = 60 * 60
+
+# Initialize API client once per process, shared by all sessions, which also share
+# its rate limit; retries are left to the wrapper so they follow that limit too
+@st.cache_resource
+def get_client():
+    return RateLimitedClient(OpenAI(api_key=st.secrets["openai_api_key"], max_retries=0), TokenBucket())
+
+# Per-session record of API calls and app phases, shown in the performance panel
+if "tracer" not in st.session_state:
+    st.session_state.tracer = Tracer()
+tracer = st.session_state.tracer
+
+# The shared client, wrapped so this session's calls are traced
+client = InstrumentedClient(get_client(), tracer)
+
+# Content hash -> OpenAI file id for every document uploaded by this app
+UPLOAD_INDEX_FILE = os.path.join(BASE_DIR, "upload_index.json")
+
+# Shared by all sessions so a document uploaded once is reused by everyone
+@st.cache_resource
+def get_upload_index():
+    return UploadIndex(UPLOAD_INDEX_FILE)
+
+# Completed evaluations, reused when the same proposal and documents come back
+EVALUATION_CACHE_FILE = os.path.join(BASE_DIR, "evaluation_cache.sqlite3")
+
+@st.cache_resource
+def get_evaluation_cache():
+    return EvaluationCache(EVALUATION_CACHE_FILE)
+
+# Evaluations in flight across all sessions, keyed like the evaluation cache
+@st.cache_resource
+def get_single_flight():
+    return SingleFlight()
+
+# Background evaluations of every session, so reruns never wait on a run
+@st.cache_resource
+def get_job_runner():
+    return JobRunner()
+
+# Routes questions between the assistant tiers using latency observed across all sessions
+@st.cache_resource
+def get_model_router():
+    return ModelRouter(LatencyStats())
+
+# Text extracted from uploaded documents, one JSON file per document
+EXTRACTION_CACHE_DIR = os.path.join(BASE_DIR, "extraction_cache")
+
+@st.cache_resource
+def get_extraction_cache():
+    return ExtractionCache(EXTRACTION_CACHE_DIR)
+
+# Local copies of conversation threads, one JSON file per thread
+HISTORY_CACHE_DIR = os.path.join(BASE_DIR, "history_cache")
+
+# Function tools offered to the assistants, those with an implementation
+ASSISTANT_FUNCTION_TOOLS = []
+
+# Building the index of a large catalogue takes a while, so it happens once per process
+# when the app starts rather than in the first tool call
+@st.cache_resource(show_spinner="Indexing the startup catalogue...")
+def load_startup_catalogue(catalogue_path):
+    # Imported here so apps without a catalogue don't load NumPy/SciPy
+    from startup_index import use_startup_catalogue
+    use_startup_catalogue(catalogue_path)
+
+# Optional local catalogue that backs the find_similar_startups tool
+if "startup_catalogue" in st.secrets:
+    load_startup_catalogue(st.secrets["startup_catalogue"])
+    ASSISTANT_FUNCTION_TOOLS.append("find_similar_startups")
+
 # Show the file path
 st.sidebar.info(f"Storage file location: {STORAGE_FILE}")
 
+def load_storage_data():
+    """Read the saved IDs, or an empty dict if nothing has been saved yet"""
+    if not os.path.exists(STORAGE_FILE):
+        return {}
+    with open(STORAGE_FILE, "r") as f:
+        return json.load(f)
+
+def update_storage_data(**fields):
+    """Merge fields into the storage file, only writing it when something changed"""
+    data = load_storage_data()
+    if all(data.get(key) == value for key, value in fields.items()):
+        return
+    data.update(fields)
+    os.makedirs(os.path.dirname(STORAGE_FILE), exist_ok=True)
+    with open(STORAGE_FILE, "w") as f:
+        json.dump(data, f)
+
+# Resolved once per process and tier, and re-verified against the API after the TTL
+@st.cache_resource(ttl=ASSISTANT_VERIFY_TTL, show_spinner=False)
+def get_assistant_id(_client, tier="full"):
+    """Load the tier's saved assistant if it still exists, otherwise create and save a new one"""
+    try:
+        data = load_storage_data()
+        assistant_id = data.get("assistant_ids", {}).get(tier)
+        # Saved before there were tiers
+        if assistant_id is None and tier == "full":
+            assistant_id = data.get("assistant_id")
+    except Exception as e:
+        print(f"Storage file error: {e}")
+        assistant_id = None
+    
+    # Verify the assistant still exists and offers the function tools
+    if assistant_id:
+        try:
+            assistant = _client.beta.assistants.retrieve(assistant_id)
+            if function_tool_names(assistant) >= set(ASSISTANT_FUNCTION_TOOLS):
+                return assistant_id
+            print(f"Assistant {assistant_id} lacks function tools, creating a new one")
+        except Exception as e:
+            print(f"Assistant retrieval error: {e}")
+    
+    assistant_id = create_assistant(_client, function_tools=ASSISTANT_FUNCTION_TOOLS, **ASSISTANT_TIERS[tier])
+    try:
+        assistant_ids = load_storage_data().get("assistant_ids", {})
+        update_storage_data(assistant_ids={**assistant_ids, tier: assistant_id})
+    except Exception as e:
+        print(f"Failed to save assistant data: {e}")
+    return assistant_id
+
 # Function to load or create assistant and thread
 def get_or_create_assistant_and_thread():
     # Default values
     assistant_id = None
     thread_id = None
     
-    # Check if storage file exists
+    # Cached across reruns and sessions, so this makes no API call after the first one
     try:
-        if os.path.exists(STORAGE_FILE):
-            with open(STORAGE_FILE, "r") as f:
-                data = json.load(f)
-                
-                # Verify the assistant still exists
-                try:
-                    assistant = client.beta.assistants.retrieve(data.get("assistant_id", ""))
-                    assistant_id = data["assistant_id"]
-                    st.sidebar.info(f"Using existing assistant: {assistant_id}")
-                except Exception as e:
-                    st.sidebar.warning(f"Assistant retrieval error: {e}")
-                    assistant_id = None
-                    
-                # # Verify the thread still exists
-                # try:
-                #     thread = client.beta.threads.retrieve(data.get("thread_id", ""))
-                #     thread_id = data["thread_id"]
-                # except Exception as e:
-                #     st.sidebar.warning(f"Thread retrieval error: {e}")
-                #     thread_id = None
+        assistant_id = get_assistant_id(client)
+        st.sidebar.info(f"Using assistant: {assistant_id}")
     except Exception as e:
-        st.sidebar.warning(f"Storage file error: {e}")
-        assistant_id = None
-        thread_id = None
+        st.sidebar.error(f"Failed to create assistant: {e}")
+        return None, None
     
-    # Create new assistant if needed
-    if assistant_id is None:
-        try:
-            assistant_id = create_assistant(client)
-            st.sidebar.success(f"Created new assistant: {assistant_id}")
-        except Exception as e:
-            st.sidebar.error(f"Failed to create assistant: {e}")
-            return None, None
+    # The thread is bound to the browser session, so it is only restored once per session
+    if "thread_id" in st.session_state:
+        thread_id = st.session_state.thread_id
+    else:
+        thread_id = restore_thread_id()
     
-    # Create new thread if needed
-    if thread_id is None:
+    return assistant_id, thread_id
+
+# Query parameter holding the session's thread, so a reload of the page reopens its conversation
+THREAD_QUERY_PARAM = "thread"
+
+def save_session_thread(thread_id):
+    """Bind a thread to this browser session, or unbind it with None"""
+    if thread_id:
+        st.query_params[THREAD_QUERY_PARAM] = thread_id
+    else:
+        st.query_params.pop(THREAD_QUERY_PARAM, None)
+
+def restore_thread_id():
+    """Restore the conversation thread bound to this browser session, if it still exists
+    
+    The thread id lives in the page URL, so other visitors never see this conversation.
+    """
+    thread_id = st.query_params.get(THREAD_QUERY_PARAM)
+    
+    # Verify the thread still exists
+    if thread_id:
         try:
-            thread_id = create_thread(client)
+            client.beta.threads.retrieve(thread_id)
+            return thread_id
         except Exception as e:
-            st.sidebar.error(f"Failed to create thread: {e}")
-            return assistant_id, None
-    
-    # Save IDs
-    try:
-        os.makedirs(os.path.dirname(STORAGE_FILE), exist_ok=True)
-        with open(STORAGE_FILE, "w") as f:
-            json.dump({
-                "assistant_id": assistant_id
-                # "thread_id": thread_id
-            }, f)
-        st.sidebar.success("Assistant data saved successfully!")
-    except Exception as e:
-        st.sidebar.error(f"Failed to save assistant data: {e}")
+            st.sidebar.warning(f"Thread retrieval error: {e}")
+    return None
+
+def ensure_thread():
+    """Return the session's thread, creating it on the first message of a conversation"""
+    if st.session_state.thread_id is None:
+        st.session_state.thread_id = create_thread(client)
+        save_session_thread(st.session_state.thread_id)
+    return st.session_state.thread_id
+
+def get_thread_vector_store():
+    """Return the file_search vector store manager of the session's thread"""
+    thread_id = ensure_thread()
+    vector_store = st.session_state.get("vector_store")
+    if vector_store is None or vector_store.thread_id != thread_id:
+        vector_store = ThreadVectorStore(client, thread_id)
+        st.session_state.vector_store = vector_store
+    return vector_store
+
+def get_message_markdown(message):
+    """Return the markdown to render for a chat message, prepared once per message id"""
+    rendered = st.session_state.setdefault("rendered_markdown", {})
+    if message["id"] not in rendered:
+        # Escape dollar signs so amounts like $5M aren't rendered as LaTeX
+        rendered[message["id"]] = message["content"].replace("$", "\\$")
+        if message.get("note"):
+            rendered[message["id"]] = f"_{message['note']}_\n\n{rendered[message['id']]}"
+    return rendered[message["id"]]
+
+def load_earlier_messages():
+    st.session_state.earlier_messages_shown = st.session_state.get("earlier_messages_shown", 0) + TRANSCRIPT_WINDOW
+
+# Reruns only this fragment when older messages are loaded, not the whole page
+@st.fragment
+def render_earlier_messages(messages):
+    """Show turns outside the transcript window collapsed, a page at a time on request"""
+    shown = min(st.session_state.get("earlier_messages_shown", 0), len(messages))
+    hidden = len(messages) - shown
+    if hidden:
+        st.button(f"Load earlier messages ({hidden} hidden)", on_click=load_earlier_messages)
     
-    return assistant_id, thread_id
+    for message in messages[len(messages) - shown:]:
+        preview = message["content"].strip().split("\n", 1)[0][:80]
+        with st.expander(f"{'🧑' if message['role'] == 'user' else '🤖'} {preview}"):
+            st.markdown(get_message_markdown(message))
+
 # Add this function BEFORE it's used in the file upload section
-def wait_for_active_runs(client, thread_id, max_wait_seconds=60):
-    """Check for and wait for any active runs to complete with timeout"""
-    start_time = time.time()
-    
-    while True:
-        # Check if we've waited too long
-        elapsed_time = time.time() - start_time
-        if elapsed_time > max_wait_seconds:
-            st.sidebar.warning(f"Timed out after waiting {max_wait_seconds} seconds for run to complete")
-            return False
-        
-        # List runs for the thread
-        runs = client.beta.threads.runs.list(thread_id=thread_id)
-        
-        # Filter for active runs
-        active_runs = [run for run in runs.data if run.status in ["queued", "in_progress"]]
-        requires_action_runs = [run for run in runs.data if run.status == "requires_action"]
-        
-        # No runs at all, we can continue
-        if not active_runs and not requires_action_runs:
-            return True
-            
-        # If there are runs requiring action, don't wait for them here
-        if requires_action_runs:
-            st.sidebar.info("Run requires action - continuing with function calling...")
-            return True
-        
-        # Only wait for queued or in_progress runs
-        if active_runs:
-            status = active_runs[0].status
-            st.sidebar.info(f"Waiting for active run to complete ({status})... {int(elapsed_time)}s elapsed")
-            time.sleep(1)
+def wait_for_active_runs(client, thread_id, max_wait_seconds=60, on_status=None):
+    """Check for and wait for any active runs to complete with timeout
+    
+    Called from background evaluations, so it reports through on_status rather than Streamlit.
+    Returns False if a run was still active when the timeout passed.
+    """
+    # A thread has at most one active run, and it is always the most recent one
+    runs = client.beta.threads.runs.list(thread_id=thread_id, limit=1)
+    if not runs.data or runs.data[0].status not in ACTIVE_RUN_STATUSES:
+        # No active runs (runs requiring action are handled by function calling)
+        return True
+    
+    watcher = RunWatcher(client, thread_id, runs.data[0].id, timeout=max_wait_seconds, on_status=on_status)
+    with tracer.span("wait_for_active_runs", thread_id=thread_id, run_id=runs.data[0].id) as span:
+        run = watcher.wait(runs.data[0])
+        span.set(polls=watcher.polls, status=run.status)
+    return run.status not in ACTIVE_RUN_STATUSES
 # Get or create assistant and thread
 assistant_id, thread_id = get_or_create_assistant_and_thread()
 st.session_state.assistant_id = assistant_id
@@ -131,19 +272,73 @@ if os.path.exists(STORAGE_FILE):
     st.sidebar.success("Assistant configuration saved!")
 else:
     st.sidebar.error("Failed to save assistant configuration!")
+# Summary of the turns that came before the current thread, and the id of the first
+# message of the transcript that is in the thread itself
+if "context_summary" not in st.session_state:
+    st.session_state.context_summary = None
+    st.session_state.context_start = None
+
 # Initialize message history
 if "messages" not in st.session_state:
     st.session_state.messages = []
-    # Fetch messages from thread
-    messages = client.beta.threads.messages.list(thread_id=st.session_state.thread_id)
-    for msg in reversed(messages.data):  # Reversed to show oldest messages first
-        role = msg.role
-        # Extract content from message parts
-        content = ""
-        for part in msg.content:
-            if part.type == "text":
-                content += part.text.value
-        st.session_state.messages.append({"role": role, "content": content})
+    # Sync the locally cached history of every thread of the conversation (a new
+    # conversation has no thread yet)
+    if st.session_state.thread_id:
+        try:
+            thread_ids = thread_chain(client, st.session_state.thread_id)
+        except Exception as e:
+            st.sidebar.warning(f"Could not find the earlier parts of the conversation: {e}")
+            thread_ids = [st.session_state.thread_id]
+        threads = []
+        for thread_id in thread_ids:
+            history = ThreadHistory(HISTORY_CACHE_DIR, thread_id)
+            try:
+                with tracer.span("sync_history", thread_id=thread_id):
+                    history.sync(client)
+            except Exception as e:
+                st.sidebar.warning(f"Could not refresh conversation history: {e}")
+            threads.append(history.messages)
+        messages, st.session_state.context_summary, st.session_state.context_start = rebuild_transcript(threads)
+        for msg in messages:
+            message = {"id": msg["id"], "role": msg["role"], "content": msg["content"]}
+            display_text = (msg.get("metadata") or {}).get("display_text")
+            if display_text:
+                message.update(content=display_text, model_content=msg["content"])
+            st.session_state.messages.append(message)
+
+# Evaluations submitted by this session, merged into the transcript once they finish
+if "jobs" not in st.session_state:
+    st.session_state.jobs = []
+
+def context_messages():
+    """The messages of the transcript that are in the current thread"""
+    messages = st.session_state.messages
+    ids = [message["id"] for message in messages]
+    start = ids.index(st.session_state.context_start) if st.session_state.context_start in ids else 0
+    return messages[start:]
+
+def merge_finished_jobs():
+    for job in [job for job in st.session_state.jobs if job.done]:
+        st.session_state.jobs.remove(job)
+        # Answers for a conversation that has since been replaced stay in their own thread
+        if job.thread_id != st.session_state.thread_id:
+            continue
+        if job.context_summary:
+            st.session_state.context_summary = job.context_summary
+        if job.status == "failed":
+            content, note = f"Error: {job.error}", None
+        else:
+            content, note = job.result, job.note
+        
+        # Placed right after the message it answers, even if later questions were asked meanwhile
+        messages = st.session_state.messages
+        ids = [message["id"] for message in messages]
+        position = ids.index(job.reply_to) + 1 if job.reply_to in ids else len(messages)
+        while position < len(messages) and messages[position]["role"] == "assistant":
+            position += 1
+        messages.insert(position, {"id": uuid.uuid4().hex, "role": "assistant", "content": content, "note": note})
+
+merge_finished_jobs()
 
 # Display chat history
 st.title("VC Assistant")
@@ -152,34 +347,39 @@ This assistant evaluates startup proposals like a venture capitalist.
 Submit your business idea to get feedback and a score.
 """)
 
-# Display chat messages
-for message in st.session_state.messages:
+# Display chat messages, older turns are collapsed and loaded on demand
+earlier_messages = st.session_state.messages[:-TRANSCRIPT_WINDOW]
+if earlier_messages:
+    render_earlier_messages(earlier_messages)
+
+for message in st.session_state.messages[-TRANSCRIPT_WINDOW:]:
     with st.chat_message(message["role"]):
-        st.write(message["content"])
+        st.markdown(get_message_markdown(message))
+
+# Set by the "Analyze All Files" button, streamed into the chat area after the sidebar
+analysis_request = None
 
 # Add this code at the BEGINNING of your sidebar section, before the file upload code:
 with st.sidebar:
     st.subheader("Conversation")
+    if st.session_state.thread_id:
+        st.caption(f"Context: ~{context_tokens(context_messages(), st.session_state.context_summary):,} tokens")
     
     # Add a prominent button to start a new conversation
     if st.button("Start New Conversation", type="primary"):  # Using 'primary' type for emphasis
-        # Create a new thread
-        new_thread_id = create_thread(client)
-        
-        # Update the storage file
+        # Rotate to a new thread, created lazily with the next message
         try:
-            with open(STORAGE_FILE, "r") as f:
-                data = json.load(f)
-            
-            data["thread_id"] = new_thread_id
-            
-            with open(STORAGE_FILE, "w") as f:
-                json.dump(data, f)
+            save_session_thread(None)
             
             # Update session state
-            st.session_state.thread_id = new_thread_id
+            st.session_state.thread_id = None
             st.session_state.messages = []
+            st.session_state.earlier_messages_shown = 0
             st.session_state.processed_files = set()
+            st.session_state.context_summary = None
+            st.session_state.context_start = None
+            # Evaluations still running finish on the old thread, this session stops following them
+            st.session_state.jobs = []
             
             st.sidebar.success("Started a new conversation!")
             st.rerun()  # Using rerun instead of experimental_rerun
@@ -206,177 +406,114 @@ with st.sidebar:
         type=["pdf", "csv", "xlsx", "docx", "txt"]
     )
     
+    # Files are identified by content, so renamed copies match and edited files don't
+    if "file_hashes" not in st.session_state:
+        st.session_state.file_hashes = {}
+    for uploaded_file in uploaded_files or []:
+        if uploaded_file.file_id not in st.session_state.file_hashes:
+            st.session_state.file_hashes[uploaded_file.file_id] = hash_content(uploaded_file.getvalue())
+    
+    def file_hash(uploaded_file):
+        return st.session_state.file_hashes[uploaded_file.file_id]
+    
     # Show what files are ready to be analyzed
     if uploaded_files:
         st.write("Files ready for analysis:")
         for uploaded_file in uploaded_files:
-            if uploaded_file.name in st.session_state.processed_files:
+            if file_hash(uploaded_file) in st.session_state.processed_files:
                 st.write(f"✅ {uploaded_file.name} (already processed)")
             else:
                 st.write(f"📄 {uploaded_file.name}")
     
     # Add a button to process all uploaded files
-    if uploaded_files and any(file.name not in st.session_state.processed_files for file in uploaded_files):
+    if uploaded_files and any(file_hash(file) not in st.session_state.processed_files for file in uploaded_files):
         if st.button("Analyze All Files"):
             file_ids = []
-            file_names = []
+            upload_index = get_upload_index()
+            
+            # First, upload all new files to OpenAI in parallel
+            pending = [
+                (uploaded_file.name, uploaded_file, file_hash(uploaded_file))
+                for uploaded_file in uploaded_files
+                if file_hash(uploaded_file) not in st.session_state.processed_files
+            ]
             
-            # First, upload all files to OpenAI
-            for uploaded_file in uploaded_files:
-                if uploaded_file.name not in st.session_state.processed_files:
-                    # Build a full path based on the current file's directory
-                    temp_file_path = os.path.join(BASE_DIR, f"{uploaded_file.name}")
-                    # print(temp_file_path)
-                    # Write the file to that path
-                    with open(temp_file_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
-                    try:
-                        # Upload file to OpenAI
-                        file = client.files.create(
-                            file=open(temp_file_path, "rb"),
-                            purpose="assistants"  # This is critical
-                        )
-                        
-                        # Add to our tracking lists
-                        file_ids.append({
-                            "file_id": file.id, 
-                            "file_name": uploaded_file.name
-                        })
-                        file_names.append(uploaded_file.name)
-                        st.sidebar.success(f"File uploaded: {uploaded_file.name}")
-                        
-                        # Clean up temp file
-                        os.remove(temp_file_path)
-                        
-                        # Mark as processed
-                        st.session_state.processed_files.add(uploaded_file.name)
-                        
-                    except Exception as e:
-                        st.sidebar.error(f"Error uploading {uploaded_file.name}: {e}")
+            # Data files are summarized locally so the run doesn't have to describe them in the
+            # sandbox, the largest are sent as their summary alone; short documents are sent as
+            # their text, so they need no upload or indexing
+            with st.spinner("Reading files..."), tracer.span("prepare_files", files=len(pending)):
+                pending, extras = prepare_files(pending, get_extraction_cache())
+            uploading = {digest for _, _, digest in pending}
+            for digest, extra in extras.items():
+                if digest not in uploading:
+                    file_ids.append({"file_id": None, **extra})
+                    if "text" in extra:
+                        st.sidebar.success(f"Read {extra['file_name']}, its text is sent with the message")
+                    else:
+                        st.sidebar.info(f"{extra['file_name']} is too large to upload, its summary is sent instead")
+                    st.session_state.processed_files.add(digest)
+            
+            progress = st.progress(0.0, text=f"Uploading {len(pending)} files...")
+            upload_span = tracer.start_span("upload_files", files=len(pending))
+            for done, (file_name, digest, file_id, reused, error) in enumerate(
+                upload_files(client, upload_index, pending), start=1
+            ):
+                progress.progress(done / len(pending), text=f"Uploaded {done} of {len(pending)} files")
+                if error:
+                    st.sidebar.error(f"Error uploading {file_name}: {error}")
+                    continue
+                
+                # Add to our tracking lists
+                file_ids.append({
+                    "file_id": file_id, 
+                    "file_name": file_name,
+                    "summary": extras.get(digest, {}).get("summary")
+                })
+                if reused:
+                    st.sidebar.success(f"File already uploaded: {file_name}")
+                else:
+                    st.sidebar.success(f"File uploaded: {file_name}")
+                
+                # Mark as processed
+                st.session_state.processed_files.add(digest)
+            tracer.end_span(upload_span)
             
             # If we have files to process
             if file_ids:
-                # Wait for any active runs
-                wait_for_active_runs(client, st.session_state.thread_id)
-                
+                ensure_thread()
                 
                 # Separate CSV files from other files for appropriate handling
-                csv_files = [f for f in file_ids if f["file_name"].lower().endswith('.csv')]
-                non_csv_files = [f for f in file_ids if not f["file_name"].lower().endswith('.csv')]
-                
-                # Create attachments list for file_search-compatible files
-                attachments = []
-                for file_info in non_csv_files:
-                    attachments.append({
-                        "file_id": file_info["file_id"],
-                        "tools": [{"type": "file_search"}]
-                    })
-                
-                # Create attachments list for CSV files that need code_interpreter
-                csv_attachments = []
-                for file_info in csv_files:
-                    csv_attachments.append({
-                        "file_id": file_info["file_id"],
-                        "tools": [{"type": "code_interpreter"}]  # CSV files need code_interpreter
-                    })
-                
-                # Create a message with all attachments
-                message_text = f"I've uploaded {len(file_ids)} files for analysis: {', '.join(file_names)}. "
+                _, documents = split_files(file_ids)
+                documents = [f for f in documents if f["file_id"]]
                 
-                if csv_files:
-                    message_text += f"The following are CSV files that need code_interpreter: {', '.join(f['file_name'] for f in csv_files)}. "
+                # Index file_search-compatible files in the conversation's vector store,
+                # waiting for ingestion to finish so the run can search them
+                if documents:
+                    with st.spinner("Indexing documents..."), tracer.span("index_files", files=len(documents)):
+                        batch = get_thread_vector_store().add_files([f["file_id"] for f in documents])
+                    if batch is None:
+                        st.sidebar.info("Documents already indexed for this conversation")
+                    elif batch.status == "in_progress":
+                        st.sidebar.warning("Indexing is taking longer than expected, some documents may not be searchable yet")
+                    elif batch.status != "completed":
+                        st.sidebar.error(f"Indexing ended with status {batch.status}, the documents may not be searchable")
+                    elif batch.file_counts.failed:
+                        st.sidebar.warning(f"{batch.file_counts.failed} documents could not be indexed")
+                    else:
+                        st.sidebar.success(f"Indexed {batch.file_counts.completed} documents")
                 
-                message_text += "Please analyze all files together for a comprehensive evaluation."
-                
-                # Create message with all attachments
-                message = client.beta.threads.messages.create(
-                    thread_id=st.session_state.thread_id,
-                    role="user",
-                    content=[{
-                        "type": "text",
-                        "text": message_text
-                    }],
-                    attachments=attachments + csv_attachments  # Combine all attachments
-                )
-                st.sidebar.write(f"Attaching files: {[a['file_id'] for a in attachments]}")
-                # run = client.beta.threads.runs.create(
-                # thread_id=thread_id,
-                # assistant_id=assistant_id)
-                # Wait for any active runs that message might create
-                wait_for_active_runs(client, st.session_state.thread_id)
-                time.sleep(5)  # Give OpenAI time to process the file
-                # Create a run to analyze all files
-                with st.spinner("Analyzing files..."):
-                    has_csv = any(file.endswith('.csv') for file in file_names)
-                    has_pdf = any(file.endswith('.pdf') for file in file_names)
-                    
-                    # Build dynamic instructions
-                    instructions = "Please analyze all the uploaded files together to provide a comprehensive evaluation. "
-
-                    if has_csv:
-                        instructions += "For CSV files, use the code_interpreter tool to analyze the data. "
-
-                    if has_pdf and has_csv:
-                        instructions += "Use both the business plan in the PDF and analyze the competitive data in the CSV files. "
-
-                    instructions += (
-                        "Use your VC evaluation framework and the configured functions to evaluate the startup proposal. "
-                    )
-
-                    # Append final, more detailed section
-                    instructions += """
-                    Please provide a comprehensive evaluation of the attached startup proposal. 
-                    Follow the structure below and ensure each bullet is explained in multiple sentences or paragraphs:
-
-                    1. Summary of the proposal (Use proposal summary or pitch deck)
-                    2. Strengths (Use proposal summary or pitch deck)
-                    3. Areas for improvement
-                    4. Team assessment (with LinkedIn profiles and a detailed table of team members if CVs are provided)
-                    5. Competitive analysis
-                    6. Overall score (1-10)
-                    7. Final recommendation
-
-                    At the end, always provide a Team Table with columns:
-                    - Experience Summary
-                    - Contact Details from CV
-
-                    Remember to reference all attached files (PDFs, CSVs, etc.) during the analysis.
-                    """
-
-                    # Use this combined instructions string when creating the run
-                    run = client.beta.threads.runs.create(
-                        thread_id=st.session_state.thread_id,
-                        assistant_id=st.session_state.assistant_id,
-                        instructions=instructions
-                    )
-                    
-                    # Wait for the run to complete
-                    wait_for_active_runs(client, st.session_state.thread_id)
-                    
-                    # Add message to chat history
-                    st.session_state.messages.append({
-                        "role": "user", 
-                        "content": message_text #f"I've uploaded {len(file_names)} files for analysis: {', '.join(file_names)}"
-                    })
-                    
-                    # Get the response
-                    response_content = get_response(client, st.session_state.thread_id, st.session_state.assistant_id)
-                    
-                    # Add to chat history
-                    st.session_state.messages.append({
-                        "role": "assistant", 
-                        "content": response_content
-                    })
-                
-                # Force rerun to refresh UI
-                st.rerun()
+                # The evaluation runs in the background and creates the message with all attachments
+                # once the thread is free; its progress is shown in the chat area
+                analysis_request = build_analysis_request(file_ids)
+                st.sidebar.write(f"Attaching files: {[a['file_id'] for a in analysis_request['attachments']]}")
     
 
 # # Button to record audio
 # transcribed_text = ""
 # if st.button("Start Recording"):
 #     try:
+#         # Voice input is optional and only loads the audio stack when used
+#         from voice import transcribe_speech
 #         transcribed_text = transcribe_speech()
 #         st.write("Transcription:")
 #         st.write(transcribed_text)
@@ -406,30 +543,244 @@ with st.sidebar:
 #         with st.spinner("Thinking..."):
 #             response_content = get_response(client, st.session_state.thread_id, st.session_state.assistant_id)
 #             st.write(response_content)   
+def evaluation_cache_key(user_text, instructions=None, tier="full"):
+    """Cache key of an evaluation in the current conversation"""
+    return evaluation_key(
+        user_text,
+        st.session_state.processed_files,
+        {"model": tier_setting(tier, "model"), "instructions": tier_setting(tier, "instructions")},
+        instructions,
+        # Earlier turns change the answer, so they are part of the key
+        context=[message.get("model_content", message["content"]) for message in st.session_state.messages]
+    )
+
+def run_evaluation(job, client, evaluation_cache, single_flight, assistant_id, cache_key, content,
+                   instructions=None, attachments=None, rollover=None, tier="full", latency_stats=None,
+                   display_text=None):
+    """Add the user's message to the thread and get the answer, in a background thread
+    
+    Serves repeated evaluations from the cache and joins identical evaluations running in
+    other sessions. Partial output goes to job.stream; no Streamlit calls are made here.
+    Returns the response and, for answers not made by a new run, a note saying where it came from.
+    With rollover, the conversation moved to job.thread_id, which is seeded first. The
+    latency of new runs is recorded in latency_stats under the tier's model. display_text
+    is kept in the message's metadata, so a restored transcript shows it instead of content.
+    """
+    thread_id = job.thread_id
+    
+    if rollover:
+        job.detail = "Summarizing the earlier conversation"
+        with tracer.span("compact_context", thread_id=thread_id, messages=len(rollover["older"])):
+            job.context_summary = seed_thread(client, thread_id, **rollover)
+    
+    def show_status(run):
+        job.detail = f"Waiting for an earlier run to finish ({run.status})"
+    
+    if not wait_for_active_runs(client, thread_id, on_status=show_status):
+        raise RuntimeError("Timed out waiting for an earlier run on this conversation to finish")
+    job.detail = None
+    
+    message_options = {"attachments": attachments} if attachments else {}
+    if display_text:
+        # Metadata values are limited to 512 characters
+        message_options["metadata"] = {"display_text": display_text[:512]}
+    client.beta.threads.messages.create(thread_id=thread_id, role="user", content=content, **message_options)
+    
+    cached = evaluation_cache.get(cache_key)
+    if cached:
+        response_content, created_at = cached
+        # Keep the thread complete so follow-up questions have the answer as context
+        create_message(client, thread_id, response_content, role="assistant")
+        job.stream.append(response_content)
+        return response_content, f"♻️ Cached evaluation from {time.strftime('%Y-%m-%d %H:%M', time.localtime(created_at))} - no new run was made"
+    
+    # Identical evaluations already running in other sessions are joined, not repeated
+    shared_stream, is_leader = single_flight.join(cache_key)
+    if is_leader:
+        chunks = single_flight.lead(cache_key, shared_stream, stream_response(
+            client,
+            thread_id,
+            assistant_id,
+            instructions=instructions,
+            on_error=shared_stream.add_error,
+            truncation_strategy=TRUNCATION_STRATEGY
+        ))
+    else:
+        job.detail = "🔗 Joined an identical evaluation already running in another session"
+        chunks = iter(shared_stream)
+    
+    with tracer.span("evaluation", thread_id=thread_id, leader=is_leader, tier=tier) as span:
+        started = time.monotonic()
+        first_token_s = None
+        for chunk in chunks:
+            if first_token_s is None:
+                first_token_s = time.monotonic() - started
+            job.stream.append(chunk)
+        response_content = job.stream.text
+        span.set(characters=len(response_content))
+    
+    if is_leader:
+        if not shared_stream.errors:
+            evaluation_cache.put(cache_key, response_content)
+            if latency_stats is not None and first_token_s is not None:
+                latency_stats.record(tier_setting(tier, "model"), first_token_s, time.monotonic() - started)
+        return response_content, None
+    
+    # The run happened on another thread, so add its answer to this conversation
+    if not shared_stream.errors:
+        create_message(client, thread_id, response_content, role="assistant")
+    return response_content, "Shared with an identical evaluation from another session"
+
+def submit_evaluation(label, reply_to, cache_key, content, instructions=None, attachments=None, tier="full",
+                      display_text=None):
+    """Evaluate in the background; the job's progress is shown until it is merged into the chat"""
+    rollover = None
+    messages = [message for message in context_messages() if message["id"] != reply_to]
+    # Only between evaluations, so no answer is left behind on the old thread
+    if (st.session_state.thread_id and not st.session_state.jobs
+            and needs_rollover(messages, st.session_state.context_summary)):
+        older, recent = split_context(messages)
+        try:
+            thread_id = start_thread(client, st.session_state.thread_id)
+        except Exception as e:
+            st.sidebar.warning(f"Could not compact the conversation: {e}")
+        else:
+            rollover = {"older": older, "recent": recent, "summary": st.session_state.context_summary}
+            st.session_state.thread_id = thread_id
+            st.session_state.context_start = recent[0]["id"]
+            save_session_thread(thread_id)
+    job = EvaluationJob(label, ensure_thread(), reply_to)
+    # Everything from Streamlit is resolved here, the job runs outside the script thread
+    evaluation_cache = get_evaluation_cache()
+    single_flight = get_single_flight()
+    assistant_id = st.session_state.assistant_id
+    if tier != "full":
+        try:
+            assistant_id = get_assistant_id(client, tier)
+        except Exception as e:
+            st.sidebar.warning(f"Could not set up the {tier} assistant, using the full one: {e}")
+            tier = "full"
+    latency_stats = get_model_router().stats
+    get_job_runner().submit(job, lambda job: run_evaluation(
+        job,
+        client,
+        evaluation_cache,
+        single_flight,
+        assistant_id,
+        cache_key,
+        content,
+        instructions=instructions,
+        attachments=attachments,
+        rollover=rollover,
+        tier=tier,
+        latency_stats=latency_stats,
+        display_text=display_text
+    ))
+    st.session_state.jobs.append(job)
+
+# Stream the evaluation of newly uploaded files
+if analysis_request:
+    tier, _ = get_model_router().choose(
+        analysis_request["message_text"],
+        attachments=analysis_request["attachments"],
+        analysis=True
+    )
+    cache_key = evaluation_cache_key(analysis_request["message_text"], analysis_request["instructions"], tier=tier)
+    
+    # Add message to chat history
+    message_id = uuid.uuid4().hex
+    # The transcript names the files; the summaries and document text only go to the model
+    st.session_state.messages.append({
+        "id": message_id,
+        "role": "user", 
+        "content": analysis_request["display_text"],
+        "model_content": analysis_request["message_text"]
+    })
+    
+    with st.chat_message("user"):
+        st.write(analysis_request["display_text"])
+    
+    submit_evaluation(
+        "Analysis of the uploaded files",
+        message_id,
+        cache_key,
+        [{"type": "text", "text": analysis_request["message_text"]}],
+        instructions=analysis_request["instructions"],
+        attachments=analysis_request["attachments"],
+        tier=tier,
+        display_text=analysis_request["display_text"]
+    )
+
 # User input area
 user_input = st.chat_input("Enter your startup proposal or question")
 
 if user_input:
+    # Follow-up questions get the quick assistant, new proposals the full evaluation
+    follow_up = any(message["role"] == "assistant" for message in context_messages())
+    tier, _ = get_model_router().choose(user_input, follow_up=follow_up)
+    cache_key = evaluation_cache_key(user_input, tier=tier)
+    
     # Add user message to chat history
     final_user_input = f"{user_input}\n\n(Please follow the VC evaluation framework and refuse irrelevant requests)."
 
     # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": final_user_input})
+    message_id = uuid.uuid4().hex
+    st.session_state.messages.append({"id": message_id, "role": "user", "content": final_user_input})
     
     # Display user message
     with st.chat_message("user"):
         st.write(user_input)
     
-    # Create message in thread
+    # Get assistant response in the background, shown token by token below
+    preview = user_input.strip().split("\n", 1)[0]
+    label = "Quick answer" if tier == "quick" else "Reply"
+    submit_evaluation(f"{label} to \"{preview[:60]}\"", message_id, cache_key, user_input, tier=tier)
 
-    create_message(client, st.session_state.thread_id, user_input)
+def render_jobs():
+    """Status and partial output of this session's evaluations; refreshes while any is running"""
+    for job in st.session_state.jobs:
+        if job.done:
+            continue
+        with st.chat_message("assistant"):
+            status = "queued behind an earlier evaluation" if job.status == "queued" else "running"
+            st.caption(f"⏳ {job.label}: {status} ({job.elapsed:.0f}s){f' - {job.detail}' if job.detail else ''}")
+            partial = job.stream.text
+            if partial:
+                st.markdown(partial.replace("$", "\\$"))
     
-    # Get assistant response
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response_content = get_response(client, st.session_state.thread_id, st.session_state.assistant_id)
-            st.write(response_content)
-    
-    # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": response_content})
+    if any(job.done for job in st.session_state.jobs):
+        # Show the finished answers in the transcript
+        st.rerun(scope="app")
+
+# Also while only finished jobs are left: one may have finished after merge_finished_jobs
+# ran, and render_jobs reruns the app to merge it
+if st.session_state.jobs:
+    st.fragment(run_every=1)(render_jobs)()
+
+def render_performance_panel():
+    """Where this session's time went: API calls and app phases, runs, and a trace export"""
+    with st.sidebar.expander("Performance"):
+        operations = tracer.operation_summary()
+        if not operations:
+            st.caption("No API calls yet")
+            return
+        st.dataframe(operations, hide_index=True)
+        runs = tracer.run_summary()
+        if runs:
+            st.caption("Runs")
+            st.dataframe(runs, hide_index=True)
+        models = get_model_router().stats.summary()
+        if models:
+            st.caption("Model latency (moving average, all sessions)")
+            st.dataframe(models, hide_index=True)
+        st.download_button(
+            "Download trace (JSON lines)",
+            tracer.export_jsonl(),
+            file_name=f"vc_assistant_trace_{tracer.trace_id}.jsonl",
+            mime="application/jsonl"
+        )
+        if st.button("Clear trace"):
+            tracer.clear()
 
+# Rendered last so it includes the calls made during this rerun
+render_performance_panel()
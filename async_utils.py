@@ -0,0 +1,182 @@
+"""Async counterparts of the utils helpers, built on openai.AsyncOpenAI
+
+A single event loop can drive many concurrent evaluations without a thread per run,
+e.g. from a headless service or a batch job. Cancelling a task that is waiting on a
+run (or closing a response stream early) cancels the run too.
+"""
+import asyncio
+from rate_limits import AsyncRateLimitedClient
+from tools import run_tool_calls
+from utils import ACTIVE_RUN_STATUSES, RunWatcher, get_message_text, read_stream_event, run_options, tool_error
+
+async def create_thread(client):
+    """Create a new thread for conversation"""
+    thread = await client.beta.threads.create()
+    return thread.id
+
+async def create_message(client, thread_id, content, role="user"):
+    """Add a message to a thread"""
+    message = await client.beta.threads.messages.create(
+        thread_id=thread_id,
+        role=role,
+        content=content
+    )
+    return message.id
+
+async def cancel_run(client, thread_id, run_id):
+    """Cancel a run, ignoring runs that have already finished"""
+    try:
+        # Shielded so the cancellation itself isn't cancelled with the caller
+        await asyncio.shield(client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id))
+    except Exception as e:
+        print(f"Could not cancel run {run_id}: {e}")
+
+class AsyncRunWatcher(RunWatcher):
+    """RunWatcher whose polls and pauses don't block the event loop"""
+
+    async def poll(self):
+        run = await self.client.beta.threads.runs.retrieve(
+            thread_id=self.thread_id,
+            run_id=self.run_id
+        )
+        self.polls += 1
+        return self.observe(run)
+
+    async def wait(self, run=None):
+        run = await self.poll() if run is None else self.observe(run)
+        for interval in self.intervals():
+            if run.status not in ACTIVE_RUN_STATUSES:
+                break
+            await asyncio.sleep(interval)
+            run = await self.poll()
+        return run
+
+async def get_response(client, thread_id, assistant_id, instructions=None, timeout=600, on_status=None):
+    """Create a run and wait for completion to get the assistant's response
+
+    If the calling task is cancelled, the run is cancelled as well.
+    """
+    run = await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        **run_options(instructions)
+    )
+
+    watcher = AsyncRunWatcher(client, thread_id, run.id, timeout=timeout, on_status=on_status)
+    run_status = run
+    try:
+        while True:
+            run_status = await watcher.wait(run_status)
+
+            if run_status.status == "completed":
+                messages = await client.beta.threads.messages.list(thread_id=thread_id)
+                for message in messages.data:
+                    if message.role == "assistant" and message.run_id == run.id:
+                        return get_message_text(message)
+                return "No response found."
+
+            elif run_status.status == "requires_action":
+                try:
+                    # Tools are blocking functions, run them off the event loop
+                    tool_outputs = await asyncio.to_thread(
+                        run_tool_calls, run_status.required_action.submit_tool_outputs.tool_calls
+                    )
+                    run_status = await client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=run.id,
+                        tool_outputs=tool_outputs
+                    )
+                except Exception as e:
+                    print(f"Error in function calling: {e}")
+                    await cancel_run(client, thread_id, run.id)
+                    return f"Error in processing functions: {e}"
+
+            elif run_status.status in ACTIVE_RUN_STATUSES:
+                await cancel_run(client, thread_id, run.id)
+                return f"Error: Timed out waiting for run {run.id} ({run_status.status})"
+
+            else:
+                return f"Error: Run ended with status {run_status.status}"
+    except asyncio.CancelledError:
+        await cancel_run(client, thread_id, run.id)
+        raise
+
+async def stream_response(client, thread_id, assistant_id, instructions=None, on_error=None):
+    """Async utils.stream_response; closing the generator before the run finishes, or
+    cancelling its task, cancels the run
+    """
+    stream = await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        stream=True,
+        **run_options(instructions)
+    )
+
+    run_id = None
+    finished = False
+    try:
+        # Each tool output submission continues the run on a new event stream
+        while stream is not None:
+            next_stream = None
+            async with stream:
+                async for event in stream:
+                    if event.event.startswith("thread.run."):
+                        run_id = event.data.id
+                    kind, value = read_stream_event(event)
+                    if kind == "text":
+                        yield value
+
+                    elif kind == "requires_action":
+                        try:
+                            tool_outputs = await asyncio.to_thread(
+                                run_tool_calls, value.required_action.submit_tool_outputs.tool_calls
+                            )
+                            next_stream = await client.beta.threads.runs.submit_tool_outputs(
+                                thread_id=thread_id,
+                                run_id=value.id,
+                                tool_outputs=tool_outputs,
+                                stream=True
+                            )
+                        except Exception as e:
+                            yield tool_error(e, on_error)
+                        break
+
+                    elif kind == "error":
+                        if on_error:
+                            on_error(value)
+                        yield value
+            stream = next_stream
+        finished = True
+    finally:
+        # Cancelled, closed early or failed while the run was still going
+        if not finished and run_id:
+            await cancel_run(client, thread_id, run_id)
+
+async def evaluate(client, assistant_id, content, instructions=None, timeout=600):
+    """Evaluate a proposal on a new thread, returning (thread_id, response)"""
+    thread_id = await create_thread(client)
+    await create_message(client, thread_id, content)
+    response = await get_response(client, thread_id, assistant_id, instructions=instructions, timeout=timeout)
+    return thread_id, response
+
+async def evaluate_many(client, assistant_id, proposals, concurrency=100, instructions=None, limiter=None):
+    """Evaluate many proposals concurrently, at most `concurrency` runs at a time
+
+    Returns (thread_id, response) pairs in the order of the proposals. A proposal that
+    fails gets (None, "Error: ...") without affecting the others. Every call goes through
+    the limiter (a TokenBucket, shared with the process's other clients when given) with
+    the usual retry budgets, unless the client is already an AsyncRateLimitedClient.
+    """
+    if not isinstance(client, AsyncRateLimitedClient):
+        client = AsyncRateLimitedClient(client, limiter)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(content):
+        async with semaphore:
+            try:
+                return await evaluate(client, assistant_id, content, instructions=instructions)
+            except Exception as e:
+                print(f"Error evaluating a proposal: {e}")
+                return None, f"Error: {e}"
+
+    return await asyncio.gather(*(bounded(content) for content in proposals))
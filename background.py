@@ -0,0 +1,85 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from single_flight import SharedStream
+
+# Evaluations running at once across all sessions
+EVALUATION_WORKERS = 8
+
+class EvaluationJob:
+    """An evaluation running in the background, with its partial output and outcome"""
+
+    def __init__(self, label, thread_id, reply_to=None):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.thread_id = thread_id
+        # Id of the chat message the result answers
+        self.reply_to = reply_to
+        self.status = "queued"
+        # What the job is doing right now, e.g. waiting for an earlier run
+        self.detail = None
+        self.stream = SharedStream()
+        self.result = None
+        self.note = None
+        self.error = None
+        # Summary of the earlier conversation, when the job moved it to a new thread
+        self.context_summary = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.submitted_at
+
+class JobRunner:
+    """Run evaluation jobs on a shared executor, one at a time per conversation thread
+
+    A thread accepts no new messages while one of its runs is active, so jobs on the
+    same thread are queued behind each other while jobs on other threads run in parallel.
+    """
+
+    def __init__(self, max_workers=EVALUATION_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="evaluation")
+        self.lock = threading.Lock()
+        self.queues = {}
+
+    def submit(self, job, work):
+        """Queue work(job), which returns (result, note), and return the job"""
+        with self.lock:
+            queue = self.queues.setdefault(job.thread_id, deque())
+            queue.append((job, work))
+            if len(queue) == 1:
+                # Nothing is running on this thread, start draining its queue
+                self.executor.submit(self.drain, job.thread_id)
+        return job
+
+    def drain(self, thread_id):
+        while True:
+            with self.lock:
+                job, work = self.queues[thread_id][0]
+            self.run(job, work)
+            with self.lock:
+                queue = self.queues[thread_id]
+                queue.popleft()
+                if not queue:
+                    del self.queues[thread_id]
+                    return
+
+    def run(self, job, work):
+        job.status = "running"
+        try:
+            job.result, job.note = work(job)
+            job.status = "completed"
+        except Exception as e:
+            print(f"Evaluation {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.stream.finish()
@@ -0,0 +1,276 @@
+"""Evaluate a batch of startup proposals without the Streamlit app
+
+    python batch.py proposals/ --output results/ [--concurrency 4] [--assistant-id asst_...]
+    python batch.py manifest.jsonl --output results/
+
+A directory holds one proposal per entry: a sub-directory with all of its documents, or
+a single document. A manifest has one JSON object per line, with file paths relative
+to the manifest:
+
+    {"id": "acme", "files": ["acme/deck.pdf", "acme/market.csv"], "text": "Optional notes"}
+
+Each proposal gets its own thread and one <id>.json result in the output directory.
+Finished proposals are appended to <output>/checkpoint.jsonl, so running the same
+command again after an interruption resumes with the proposals that are left, scored
+by the same assistant, whose id is kept in <output>/assistant.json.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from openai import OpenAI
+from utils import create_assistant, create_thread, get_response
+from uploads import UploadIndex, hash_file, upload_files
+from vector_stores import ThreadVectorStore
+from analysis import build_analysis_request, prepare_files, split_files
+from extraction import ExtractionCache
+from rate_limits import RateLimitedClient, TokenBucket, API_REQUESTS_PER_SECOND
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Shared with the app, so documents it has already uploaded are reused
+UPLOAD_INDEX_FILE = os.path.join(BASE_DIR, "upload_index.json")
+EXTRACTION_CACHE_DIR = os.path.join(BASE_DIR, "extraction_cache")
+
+SUPPORTED_EXTENSIONS = (".pdf", ".csv", ".xlsx", ".docx", ".txt")
+# Proposals evaluated at the same time
+BATCH_CONCURRENCY = 4
+# Longest a single evaluation run may take
+BATCH_RUN_TIMEOUT = 900
+CHECKPOINT_FILE = "checkpoint.jsonl"
+# The assistant created for a batch, kept so a resumed batch is scored by the same one
+ASSISTANT_FILE = "assistant.json"
+
+SCORE_PATTERN = re.compile(r"overall score\W*(\d+(?:\.\d+)?)\s*(?:/|out of)\s*10", re.IGNORECASE)
+
+def load_proposals(source):
+    """List the proposals of a directory or manifest as {"id", "files", "text"} dicts"""
+    if os.path.isdir(source):
+        proposals = []
+        for entry in sorted(os.listdir(source)):
+            path = os.path.join(source, entry)
+            if os.path.isdir(path):
+                files = [
+                    os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS)
+                ]
+                if files:
+                    proposals.append({"id": entry, "files": files, "text": None})
+            elif entry.lower().endswith(SUPPORTED_EXTENSIONS):
+                proposals.append({"id": os.path.splitext(entry)[0], "files": [path], "text": None})
+        return proposals
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    proposals = []
+    with open(source, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "id" not in entry:
+                raise ValueError(f"{source}:{line_number}: every proposal needs an id")
+            proposals.append({
+                "id": str(entry["id"]),
+                "files": [os.path.join(base_dir, path) for path in entry.get("files", [])],
+                "text": entry.get("text")
+            })
+    return proposals
+
+def load_checkpoint(output_dir):
+    """Ids of the proposals whose latest evaluation completed"""
+    completed = set()
+    try:
+        with open(os.path.join(output_dir, CHECKPOINT_FILE), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short by an interruption
+                    continue
+                if entry["status"] == "completed":
+                    completed.add(entry["id"])
+                else:
+                    completed.discard(entry["id"])
+    except FileNotFoundError:
+        pass
+    return completed
+
+def get_batch_assistant(client, output_dir):
+    """The assistant created for this output directory if it still exists, otherwise a new one"""
+    path = os.path.join(output_dir, ASSISTANT_FILE)
+    try:
+        with open(path, "r") as f:
+            assistant_id = json.load(f)["assistant_id"]
+        client.beta.assistants.retrieve(assistant_id)
+        return assistant_id
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Could not reuse the batch's assistant, creating a new one: {e}")
+    assistant_id = create_assistant(client)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"assistant_id": assistant_id}, f)
+    return assistant_id
+
+def parse_score(response):
+    match = SCORE_PATTERN.search(response or "")
+    return float(match.group(1)) if match else None
+
+def result_path(output_dir, proposal_id):
+    file_name = re.sub(r"[^\w.-]+", "_", proposal_id)
+    return os.path.join(output_dir, f"{file_name}.json")
+
+def evaluate_proposal(client, upload_index, extraction_cache, assistant_id, proposal, timeout=BATCH_RUN_TIMEOUT):
+    """Upload a proposal's documents to a new thread and evaluate it, returning its result"""
+    started_at = time.time()
+    thread_id = create_thread(client)
+    result = {"id": proposal["id"], "files": proposal["files"], "thread_id": thread_id, "warnings": []}
+
+    with ExitStack() as stack:
+        # Files are read from disk as needed; large ones are hashed and uploaded from a memory map
+        pending = []
+        for path in proposal["files"]:
+            f = stack.enter_context(open(path, "rb"))
+            pending.append((os.path.basename(path), f, hash_file(f)))
+
+        # Data files are summarized locally, the largest are sent as their summary alone;
+        # short documents are sent as their text
+        pending, extras = prepare_files(pending, extraction_cache)
+        uploading = {digest for _, _, digest in pending}
+        uploaded = [{"file_id": None, **extra} for digest, extra in extras.items() if digest not in uploading]
+        for file_name, digest, file_id, reused, error in upload_files(client, upload_index, pending):
+            if error:
+                raise RuntimeError(f"Error uploading {file_name}: {error}")
+            uploaded.append({"file_id": file_id, "file_name": file_name, "summary": extras.get(digest, {}).get("summary")})
+
+    # Documents are searched through the thread's vector store
+    _, documents = split_files(uploaded)
+    documents = [f for f in documents if f["file_id"]]
+    if documents:
+        batch = ThreadVectorStore(client, thread_id).add_files([f["file_id"] for f in documents])
+        if batch is not None and batch.status != "completed":
+            result["warnings"].append("Indexing did not finish, some documents may not have been searched")
+        elif batch is not None and batch.file_counts.failed:
+            result["warnings"].append(f"{batch.file_counts.failed} documents could not be indexed")
+
+    if uploaded:
+        request = build_analysis_request(uploaded, proposal["text"])
+    else:
+        request = {"message_text": proposal["text"] or "", "instructions": None, "attachments": []}
+    message_options = {"attachments": request["attachments"]} if request["attachments"] else {}
+    client.beta.threads.messages.create(
+        thread_id=thread_id,
+        role="user",
+        content=request["message_text"],
+        **message_options
+    )
+
+    response = get_response(client, thread_id, assistant_id, timeout=timeout, instructions=request["instructions"])
+    failed = response.startswith("Error")
+    result.update({
+        "status": "failed" if failed else "completed",
+        "error": response if failed else None,
+        "response": None if failed else response,
+        "score": None if failed else parse_score(response),
+        "started_at": started_at,
+        "duration_s": time.time() - started_at
+    })
+    return result
+
+def write_result(output_dir, result):
+    """Write a proposal's result atomically, then record it in the checkpoint"""
+    path = result_path(output_dir, result["id"])
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    with open(os.path.join(output_dir, CHECKPOINT_FILE), "a") as f:
+        f.write(json.dumps({"id": result["id"], "status": result["status"], "result": os.path.basename(path)}) + "\n")
+
+def run_batch(client, proposals, output_dir, assistant_id, concurrency=BATCH_CONCURRENCY, timeout=BATCH_RUN_TIMEOUT,
+              upload_index_file=UPLOAD_INDEX_FILE):
+    """Evaluate the proposals not completed yet, returning the number that completed and failed"""
+    os.makedirs(output_dir, exist_ok=True)
+    completed = load_checkpoint(output_dir)
+    remaining = [proposal for proposal in proposals if proposal["id"] not in completed]
+    print(f"{len(proposals)} proposals, {len(proposals) - len(remaining)} already done, {len(remaining)} to evaluate")
+
+    upload_index = UploadIndex(upload_index_file)
+    extraction_cache = ExtractionCache(EXTRACTION_CACHE_DIR)
+    counts = {"completed": 0, "failed": 0}
+    # Not a with block: its exit would wait for the runs in progress even after a second Ctrl-C
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    futures = {
+        executor.submit(evaluate_proposal, client, upload_index, extraction_cache, assistant_id, proposal, timeout): proposal
+        for proposal in remaining
+    }
+    recorded = set()
+
+    def record(future):
+        proposal = futures[future]
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"id": proposal["id"], "files": proposal["files"], "status": "failed", "error": str(e)}
+        # Results are only written from this thread, so the checkpoint needs no lock
+        write_result(output_dir, result)
+        counts[result["status"]] += 1
+        recorded.add(future)
+        score = f", score {result['score']:g}" if result.get("score") is not None else ""
+        print(f"[{len(recorded)}/{len(remaining)}] {proposal['id']}: {result['status']}{score}"
+              f"{' - ' + result['error'] if result.get('error') else ''}")
+
+    try:
+        for future in as_completed(futures):
+            record(future)
+    except KeyboardInterrupt:
+        # Proposals not started are left for the next run; the runs in progress are still
+        # recorded as they finish, unless Ctrl-C is pressed again, in which case they are
+        # evaluated again on resume (their threads still end within the run timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+        running = [future for future in futures if not future.cancelled() and future not in recorded]
+        print(f"Interrupted, waiting for {len(running)} runs in progress (Ctrl-C again to skip them)")
+        for future in as_completed(running):
+            record(future)
+        raise
+    finally:
+        executor.shutdown(wait=False)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="directory of proposals or JSON-lines manifest")
+    parser.add_argument("--output", required=True, help="directory for results and the checkpoint")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--requests-per-second", type=float, default=API_REQUESTS_PER_SECOND)
+    parser.add_argument("--timeout", type=float, default=BATCH_RUN_TIMEOUT, help="seconds allowed per run")
+    parser.add_argument("--assistant-id", help="existing assistant to use (default: the one created for --output)")
+    parser.add_argument("--offline", action="store_true", help="dry run against the offline fake API")
+    args = parser.parse_args()
+
+    upload_index_file = UPLOAD_INDEX_FILE
+    if args.offline:
+        from fake_openai import FakeOpenAI
+        api_client = FakeOpenAI()
+        # Fake file ids must not end up in the index the app uses
+        upload_index_file = os.path.join(args.output, "offline_upload_index.json")
+    else:
+        api_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"], max_retries=0)
+    client = RateLimitedClient(api_client, TokenBucket(rate=args.requests_per_second))
+
+    proposals = load_proposals(args.source)
+    assistant_id = args.assistant_id or get_batch_assistant(client, args.output)
+    try:
+        counts = run_batch(client, proposals, args.output, assistant_id, args.concurrency, args.timeout,
+                           upload_index_file)
+    except KeyboardInterrupt:
+        print("Interrupted, run the same command again to resume")
+        return 130
+    print(f"Done: {counts['completed']} completed, {counts['failed']} failed")
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Keeping the context of long conversations bounded
+
+Runs only read the latest messages of a thread (TRUNCATION_STRATEGY). Once the
+conversation grows past CONTEXT_ROLLOVER_TOKENS, its older turns are summarized and it
+moves to a new thread that starts with the summary and the latest messages, so every
+run reads a context of about the same size however long the conversation gets.
+Each thread links to the one before it, so the whole transcript can be rebuilt.
+"""
+from utils import ASSISTANT_MODEL, create_message
+
+# Rough size of a token in English text, good enough to decide when to compact
+CHARS_PER_TOKEN = 4
+# Role and formatting tokens added to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Runs only see this many of the thread's latest messages
+TRUNCATION_LAST_MESSAGES = 20
+TRUNCATION_STRATEGY = {"type": "last_messages", "last_messages": TRUNCATION_LAST_MESSAGES}
+# Estimated context size past which the conversation is summarized onto a new thread
+CONTEXT_ROLLOVER_TOKENS = 24_000
+# Latest messages copied to the new thread as they are
+CARRIED_MESSAGES = 4
+# Length of the summary of the older turns
+SUMMARY_MAX_TOKENS = 1_000
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+# Thread metadata key holding the thread the conversation continued from
+PREVIOUS_THREAD_KEY = "previous_thread"
+# Message metadata key marking the summary and carried messages a new thread starts with
+SEED_KEY = "context"
+
+SUMMARY_INSTRUCTIONS = """
+Summarize this conversation between a founder and a venture capital analyst so the
+analyst can continue it without the transcript. Keep every startup discussed with its
+key facts and figures, the scores and recommendations given, the documents analyzed
+and what they showed, and any open questions. Be concise and factual.
+"""
+
+def estimate_tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+def model_content(message):
+    """The text the model got for a transcript message, which may show a shorter one"""
+    return message.get("model_content") or message["content"]
+
+def context_tokens(messages, summary=None):
+    """Estimated tokens a run reads from a thread with these {"role", "content"} messages"""
+    tokens = sum(estimate_tokens(model_content(message)) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+    if summary:
+        tokens += estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS
+    return tokens
+
+def needs_rollover(messages, summary=None):
+    """Whether the conversation should move to a new thread before the next run
+
+    Also true once the summary would fall out of the truncation window. False when the
+    latest messages alone are so long that moving would hardly make the context smaller.
+    """
+    if len(messages) <= CARRIED_MESSAGES:
+        return False
+    _, recent = split_context(messages)
+    if context_tokens(recent) + SUMMARY_MAX_TOKENS > CONTEXT_ROLLOVER_TOKENS // 2:
+        return False
+    return (context_tokens(messages, summary) > CONTEXT_ROLLOVER_TOKENS
+            or len(messages) + 2 > TRUNCATION_LAST_MESSAGES)
+
+def split_context(messages):
+    """(older messages to summarize, latest messages to carry over)"""
+    return messages[:-CARRIED_MESSAGES], messages[-CARRIED_MESSAGES:]
+
+def start_thread(client, thread_id):
+    """Create the thread a conversation continues on, with the old thread's files"""
+    thread = client.beta.threads.retrieve(thread_id)
+    resources = thread.tool_resources
+    tool_resources = {}
+    # The documents stay searchable without being indexed again
+    if resources and resources.file_search and resources.file_search.vector_store_ids:
+        tool_resources["file_search"] = {"vector_store_ids": list(resources.file_search.vector_store_ids)}
+    if resources and getattr(resources, "code_interpreter", None) and resources.code_interpreter.file_ids:
+        tool_resources["code_interpreter"] = {"file_ids": list(resources.code_interpreter.file_ids)}
+    options = {"tool_resources": tool_resources} if tool_resources else {}
+    return client.beta.threads.create(metadata={PREVIOUS_THREAD_KEY: thread_id}, **options).id
+
+def summarize_messages(client, messages, summary=None):
+    """Summarize the messages (and the summary of what came before them) in one completion"""
+    transcript = [f"{SUMMARY_PREFIX}\n{summary}"] if summary else []
+    transcript += [f"{message['role'].upper()}: {model_content(message)}" for message in messages]
+    completion = client.chat.completions.create(
+        model=ASSISTANT_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": "\n\n".join(transcript)}
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0.2
+    )
+    return completion.choices[0].message.content
+
+def seed_thread(client, thread_id, older, recent, summary=None):
+    """Start a new thread with the summary of the older messages and the latest ones as they are
+
+    Returns the new summary, or None if the older messages could not be summarized, in
+    which case only the latest messages are carried over.
+    """
+    try:
+        summary = summarize_messages(client, older, summary)
+    except Exception as e:
+        print(f"Could not summarize the conversation: {e}")
+        summary = None
+    if summary:
+        create_message(client, thread_id, f"{SUMMARY_PREFIX}\n{summary}", role="assistant",
+                       metadata={SEED_KEY: "summary"})
+    for message in recent:
+        if model_content(message):
+            create_message(client, thread_id, model_content(message), role=message["role"],
+                           metadata={SEED_KEY: "carried"})
+    return summary
+
+def thread_chain(client, thread_id):
+    """Ids of the threads the conversation went through, oldest first, ending with thread_id"""
+    chain = [thread_id]
+    thread = client.beta.threads.retrieve(thread_id)
+    while True:
+        previous = (thread.metadata or {}).get(PREVIOUS_THREAD_KEY)
+        if not previous or previous in chain:
+            return chain
+        try:
+            thread = client.beta.threads.retrieve(previous)
+        except Exception as e:
+            print(f"Could not retrieve earlier thread {previous}: {e}")
+            return chain
+        chain.insert(0, previous)
+
+def rebuild_transcript(threads):
+    """Rebuild a conversation from the cached messages of each of its threads, oldest first
+
+    Returns (messages, summary, context_start) like the app keeps them: the summary and
+    carried messages each thread starts with are left out of the transcript, they only
+    give the latest summary and the first message that is in the latest thread.
+    """
+    messages, summary, context_start = [], None, None
+    for thread_messages in threads:
+        summary, carried, start = None, 0, len(messages)
+        for message in thread_messages:
+            seed = (message.get("metadata") or {}).get(SEED_KEY)
+            if seed == "summary":
+                summary = message["content"].removeprefix(f"{SUMMARY_PREFIX}\n")
+            elif seed == "carried":
+                carried += 1
+            else:
+                messages.append(message)
+        # The carried messages are copies of the last ones of the thread before
+        start = max(start - carried, 0)
+        context_start = messages[start]["id"] if start < len(messages) else None
+    return messages, summary, context_start
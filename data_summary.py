@@ -0,0 +1,324 @@
+import math
+import warnings
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+# Rows parsed at a time, which bounds memory whatever the file size
+DATA_CHUNK_ROWS = 50_000
+# Most frequent values listed for text columns
+TOP_VALUES = 5
+# Distinct text values tracked per column; beyond this the counts become approximate
+MAX_TRACKED_VALUES = 10_000
+# Columns described in the summary text, the rest are only counted
+MAX_SUMMARY_COLUMNS = 60
+# A column is numeric (or a date column) when at least this share of its values are numbers (or dates)
+NUMERIC_SHARE = 0.95
+# Text values tried as dates before deciding whether a text column holds dates
+DATE_SAMPLE_VALUES = 100
+
+class ColumnSummary:
+    """Streaming statistics of one column, updated a chunk at a time"""
+
+    def __init__(self, name):
+        self.name = name
+        self.values = 0
+        self.nulls = 0
+        # Numeric values: count, mean and sum of squared deviations, merged chunk by chunk
+        self.numbers = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.first = None
+        self.last = None
+        # Row-over-row relative changes, in file order and in reverse file order
+        self.growth_total = 0.0
+        self.growth_count = 0
+        self.backward_growth_total = 0.0
+        self.backward_growth_count = 0
+        # Values at the earliest and latest time of the table's time axis, see add_times
+        self.earliest = None
+        self.latest = None
+        # Dates: count, range and whether they only go up or only go down in file order
+        self.dates = 0
+        self.date_min = None
+        self.date_max = None
+        self.last_date = None
+        self.ascending = True
+        self.descending = True
+        # Whether the text values parse as dates, decided on a sample of the first ones
+        self.text_dates = None
+        # Values that are neither numbers nor dates
+        self.text_counts = Counter()
+        self.approximate = False
+        # This chunk's numbers and dates by row, for lining values up with the time axis
+        self.chunk_numbers = None
+        self.chunk_dates = None
+
+    def update(self, series):
+        self.chunk_numbers = self.chunk_dates = None
+        missing = series.isna()
+        self.nulls += int(missing.sum())
+        present = series[~missing]
+        self.values += len(present)
+        if not len(present):
+            return
+
+        # Spreadsheet dates arrive as datetimes, which to_numeric would turn into epoch numbers
+        if pd.api.types.is_datetime64_any_dtype(present):
+            self.add_dates(present)
+            return
+
+        numbers = pd.to_numeric(present, errors="coerce")
+        is_number = numbers.notna().to_numpy()
+        values = numbers.to_numpy(dtype=np.float64)[is_number]
+        if len(values):
+            self.add_numbers(values)
+            self.chunk_numbers = numbers[is_number].astype(np.float64)
+
+        text = present[~is_number]
+        if len(text) and self.text_dates is None:
+            self.text_dates = parse_dates(text.head(DATE_SAMPLE_VALUES)).notna().mean() >= NUMERIC_SHARE
+        if len(text) and self.text_dates:
+            dates = parse_dates(text)
+            is_date = dates.notna().to_numpy()
+            if is_date.any():
+                self.add_dates(dates[is_date])
+            text = text[~is_date]
+        if len(text):
+            self.text_counts.update(text.astype(str).value_counts().to_dict())
+            if len(self.text_counts) > MAX_TRACKED_VALUES:
+                # Keep the most frequent half, so memory stays bounded on high-cardinality columns
+                self.text_counts = Counter(dict(self.text_counts.most_common(MAX_TRACKED_VALUES // 2)))
+                self.approximate = True
+
+    def add_numbers(self, values):
+        count = len(values)
+        chunk_mean = values.mean()
+        chunk_m2 = ((values - chunk_mean) ** 2).sum()
+        total = self.numbers + count
+        delta = chunk_mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += chunk_m2 + delta ** 2 * self.numbers * count / total
+        self.numbers = total
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+        # Changes are chained across chunks through the last value of the previous chunk
+        series = values if self.last is None else np.concatenate([[self.last], values])
+        previous, current = series[:-1], series[1:]
+        valid = previous != 0
+        changes = (current[valid] - previous[valid]) / np.abs(previous[valid])
+        changes = changes[np.isfinite(changes)]
+        self.growth_total += float(changes.sum())
+        self.growth_count += len(changes)
+        # The same changes read the other way, for files that list the latest rows first
+        valid = current != 0
+        changes = (previous[valid] - current[valid]) / np.abs(current[valid])
+        changes = changes[np.isfinite(changes)]
+        self.backward_growth_total += float(changes.sum())
+        self.backward_growth_count += len(changes)
+
+        if self.first is None:
+            self.first = float(values[0])
+        self.last = float(values[-1])
+
+    def add_dates(self, dates):
+        self.dates += len(dates)
+        values = dates.to_numpy()
+        self.date_min = values.min() if self.date_min is None else min(self.date_min, values.min())
+        self.date_max = values.max() if self.date_max is None else max(self.date_max, values.max())
+        # Order is checked across chunks through the last date of the previous chunk
+        series = values if self.last_date is None else np.concatenate([[self.last_date], values])
+        steps = np.diff(series)
+        self.ascending = self.ascending and bool((steps >= np.timedelta64(0)).all())
+        self.descending = self.descending and bool((steps <= np.timedelta64(0)).all())
+        self.last_date = values[-1]
+        self.chunk_dates = dates
+
+    def add_times(self, times):
+        """Track the values at the earliest and latest times of this chunk's rows of the time axis"""
+        if self.chunk_numbers is None or times is None:
+            return
+        times = times.reindex(self.chunk_numbers.index).to_numpy()
+        valid = ~pd.isna(times)
+        if not valid.any():
+            return
+        times, values = times[valid], self.chunk_numbers.to_numpy()[valid]
+        earliest, latest = times.argmin(), times.argmax()
+        if self.earliest is None or times[earliest] < self.earliest[0]:
+            self.earliest = (times[earliest], float(values[earliest]))
+        if self.latest is None or times[latest] > self.latest[0]:
+            self.latest = (times[latest], float(values[latest]))
+
+    @property
+    def is_numeric(self):
+        return self.values > 0 and self.numbers >= NUMERIC_SHARE * self.values
+
+    @property
+    def is_date(self):
+        return self.values > 0 and self.dates >= NUMERIC_SHARE * self.values
+
+    def to_dict(self, time_axis=None):
+        """Summary of the column; numeric growth is measured along time_axis, the table's date column, if any"""
+        column_type = "date" if self.is_date else "numeric" if self.is_numeric else "text"
+        summary = {"name": self.name, "type": column_type, "values": self.values, "nulls": self.nulls}
+        if self.is_date:
+            start, end = pd.Timestamp(self.date_min), pd.Timestamp(self.date_max)
+            summary.update({
+                "start": format_date(start),
+                "end": format_date(end),
+                "span_days": (end - start) / pd.Timedelta(days=1)
+            })
+        elif self.is_numeric:
+            first, last, growth_axis = self.first, self.last, None
+            row_growth = self.growth_total / self.growth_count if self.growth_count else None
+            if time_axis is not None and self.earliest and self.latest:
+                (start, first), (end, last) = self.earliest, self.latest
+                growth_axis = {"name": time_axis.name, "start": format_date(pd.Timestamp(start)),
+                               "end": format_date(pd.Timestamp(end))}
+                # Rows only follow the time axis when the file is sorted by it
+                if time_axis.descending and not time_axis.ascending:
+                    row_growth = (self.backward_growth_total / self.backward_growth_count
+                                  if self.backward_growth_count else None)
+                elif not time_axis.ascending:
+                    row_growth = None
+            summary.update({
+                "mean": self.mean,
+                "std": math.sqrt(self.m2 / (self.numbers - 1)) if self.numbers > 1 else 0.0,
+                "min": self.minimum,
+                "max": self.maximum,
+                "first": first,
+                "last": last,
+                "growth_axis": growth_axis,
+                "total_growth": (last - first) / abs(first) if first else None,
+                "mean_row_growth": row_growth
+            })
+        else:
+            summary.update({
+                "distinct": len(self.text_counts),
+                "distinct_is_lower_bound": self.approximate,
+                "top_values": self.text_counts.most_common(TOP_VALUES)
+            })
+        return summary
+
+def parse_dates(values):
+    """Dates of the values, NaT for those that are not dates"""
+    with warnings.catch_warnings():
+        # Text in no single format is parsed value by value, which pandas warns about
+        warnings.simplefilter("ignore", UserWarning)
+        return pd.to_datetime(values, errors="coerce")
+
+def format_date(timestamp):
+    if timestamp == timestamp.normalize():
+        return timestamp.strftime("%Y-%m-%d")
+    return timestamp.strftime("%Y-%m-%d %H:%M")
+
+def csv_chunks(file):
+    yield from pd.read_csv(file, chunksize=DATA_CHUNK_ROWS, low_memory=True)
+
+def xlsx_chunks(file):
+    """Yield (sheet name, DataFrame chunk) for every sheet, streaming rows in read-only mode"""
+    # Only needed for spreadsheets, so CSV-only setups don't need openpyxl
+    from openpyxl import load_workbook
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = [str(name) if name is not None else f"column_{number}" for number, name in enumerate(header, start=1)]
+            chunk = []
+            for row in rows:
+                chunk.append(row[:len(columns)])
+                if len(chunk) == DATA_CHUNK_ROWS:
+                    yield sheet.title, pd.DataFrame(chunk, columns=columns)
+                    chunk = []
+            if chunk:
+                yield sheet.title, pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+def summarize_frames(frames):
+    """Summarize (table name, DataFrame chunk) pairs into one summary per table"""
+    tables = {}
+    for table, frame in frames:
+        summary = tables.setdefault(table, {"name": table, "rows": 0, "columns": {}, "time_axis": None})
+        summary["rows"] += len(frame)
+        for column in frame.columns:
+            name = str(column)
+            if name not in summary["columns"]:
+                summary["columns"][name] = ColumnSummary(name)
+            summary["columns"][name].update(frame[column])
+        # The first date column is the time axis growth is measured along
+        if summary["time_axis"] is None:
+            summary["time_axis"] = next((column for column in summary["columns"].values() if column.is_date), None)
+        if summary["time_axis"] is not None:
+            for column in summary["columns"].values():
+                column.add_times(summary["time_axis"].chunk_dates)
+    results = []
+    for table in tables.values():
+        time_axis = table["time_axis"]
+        if time_axis is not None and not time_axis.is_date:
+            time_axis = None
+        results.append({"name": table["name"], "rows": table["rows"],
+                        "columns": [column.to_dict(time_axis) for column in table["columns"].values()]})
+    return results
+
+def summarize_data_file(file_name, file):
+    """Summarize a CSV or XLSX file (path or file object) chunk by chunk, one summary per sheet"""
+    if file_name.lower().endswith(".xlsx"):
+        return summarize_frames(xlsx_chunks(file))
+    return summarize_frames((file_name, chunk) for chunk in csv_chunks(file))
+
+def format_number(value):
+    if value is None:
+        return "n/a"
+    if abs(value) >= 1e6 or (value and abs(value) < 1e-3):
+        return f"{value:.3g}"
+    return f"{value:,.2f}".rstrip("0").rstrip(".")
+
+def format_change(value):
+    return f"{value * 100:+.3g}%"
+
+def format_summary(file_name, tables):
+    """Compact text description of a data file for the message, column by column"""
+    lines = [f"Summary of {file_name} (computed locally over every row):"]
+    for table in tables:
+        columns = table["columns"]
+        name = f" sheet {table['name']}:" if table["name"] != file_name else ""
+        lines.append(f"-{name} {table['rows']:,} rows x {len(columns)} columns")
+        for column in columns[:MAX_SUMMARY_COLUMNS]:
+            nulls = f", {column['nulls']:,} empty" if column["nulls"] else ""
+            if column["type"] == "date":
+                lines.append(
+                    f"  - {column['name']} (date{nulls}): {column['start']} to {column['end']} "
+                    f"({format_number(column['span_days'])} days)"
+                )
+            elif column["type"] == "numeric":
+                growth = ""
+                if column["total_growth"] is not None:
+                    axis = column["growth_axis"]
+                    period = f"from {axis['start']} to {axis['end']} by {axis['name']}" if axis else "overall"
+                    growth = f", {format_number(column['first'])} -> {format_number(column['last'])} ({format_change(column['total_growth'])} {period}"
+                    if column["mean_row_growth"] is not None:
+                        growth += f", {format_change(column['mean_row_growth'])} per row on average"
+                    growth += ")"
+                lines.append(
+                    f"  - {column['name']} (numeric{nulls}): mean {format_number(column['mean'])}, "
+                    f"std {format_number(column['std'])}, range {format_number(column['min'])} to "
+                    f"{format_number(column['max'])}{growth}"
+                )
+            else:
+                if column["distinct_is_lower_bound"] or column["distinct"] == column["values"]:
+                    # Identifiers, names and the like: counts say nothing, a few examples do
+                    examples = ", ".join(str(value) for value, _ in column["top_values"][:3])
+                    lines.append(f"  - {column['name']} (text{nulls}): mostly unique values, e.g. {examples}")
+                else:
+                    top = ", ".join(f"{value} ({count:,})" for value, count in column["top_values"])
+                    lines.append(f"  - {column['name']} (text{nulls}): {column['distinct']:,} distinct; most common: {top}")
+        if len(columns) > MAX_SUMMARY_COLUMNS:
+            lines.append(f"  - ... and {len(columns) - MAX_SUMMARY_COLUMNS} more columns")
+    return "\n".join(lines)
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Cache bounds, the least recently used evaluations are evicted first
+EVAL_CACHE_MAX_ENTRIES = 1000
+EVAL_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+def normalize_text(text):
+    """Collapse whitespace and case so trivially different prompts share a key"""
+    return " ".join(text.split()).casefold()
+
+def evaluation_key(user_text, document_hashes, assistant_config, run_instructions="", context=()):
+    """Build the cache key of an evaluation
+
+    The key covers everything that shapes the answer: the user's text, the content
+    hashes of the attached documents, the assistant's model and instructions, the run
+    instructions, and the earlier turns of the conversation.
+    """
+    payload = json.dumps({
+        "text": normalize_text(user_text),
+        "documents": sorted(document_hashes),
+        "assistant": assistant_config,
+        "instructions": normalize_text(run_instructions or ""),
+        "context": [normalize_text(turn) for turn in context]
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class EvaluationCache:
+    """Persistent LRU cache of evaluation responses, bounded by entry count and total size"""
+
+    def __init__(self, path, max_entries=EVAL_CACHE_MAX_ENTRIES, max_bytes=EVAL_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # One connection shared by every session in the process, serialized by the lock
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations ("
+                "key TEXT PRIMARY KEY, response TEXT, size INTEGER, created_at REAL, used_at REAL)"
+            )
+
+    def get(self, key):
+        """Return (response, created_at) for a cached evaluation, or None"""
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT response, created_at FROM evaluations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE evaluations SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def put(self, key, response):
+        """Store an evaluation and evict the least recently used ones beyond the bounds"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM evaluations").fetchone()
+            if count <= self.max_entries and total <= self.max_bytes:
+                return
+            evicted = []
+            for old_key, old_size in self.db.execute("SELECT key, size FROM evaluations ORDER BY used_at"):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                evicted.append((old_key,))
+                count -= 1
+                total -= old_size
+            self.db.executemany("DELETE FROM evaluations WHERE key = ?", evicted)
@@ -0,0 +1,173 @@
+import io
+import json
+import os
+import zipfile
+from collections import Counter
+from xml.etree.ElementTree import iterparse
+from utils import write_json_atomic
+
+DOCUMENT_EXTENSIONS = (".pdf", ".docx", ".txt")
+# Documents with more text than this are uploaded for file_search instead of inlined
+INLINE_DOCUMENT_MAX_CHARS = 20_000
+# Text formats have no pages, they are streamed in blocks of about this size
+TEXT_PAGE_CHARS = 3_000
+# Size of the chunks the extracted text is stored and inlined in
+CHUNK_CHARS = 2_000
+# Bump when extraction changes so cached results are redone
+EXTRACTION_VERSION = 1
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def is_document(file_name):
+    return file_name.lower().endswith(DOCUMENT_EXTENSIONS)
+
+def pdf_pages(file):
+    # Only needed for PDFs, so the app starts without loading pypdf
+    from pypdf import PdfReader
+    for page in PdfReader(file).pages:
+        yield page.extract_text() or ""
+
+def docx_pages(file):
+    """Stream the paragraphs of a DOCX from its XML, grouped into page-sized blocks"""
+    with zipfile.ZipFile(file) as archive, archive.open("word/document.xml") as document:
+        block, size, paragraph = [], 0, []
+        for _, element in iterparse(document, events=("end",)):
+            if element.tag == f"{WORD_NAMESPACE}t":
+                paragraph.append(element.text or "")
+            elif element.tag == f"{WORD_NAMESPACE}tab":
+                paragraph.append("\t")
+            elif element.tag in (f"{WORD_NAMESPACE}br", f"{WORD_NAMESPACE}cr"):
+                paragraph.append("\n")
+            elif element.tag == f"{WORD_NAMESPACE}p":
+                text = "".join(paragraph)
+                paragraph = []
+                # Parsed paragraphs are dropped so memory doesn't grow with the document
+                element.clear()
+                block.append(text)
+                size += len(text) + 1
+                if size >= TEXT_PAGE_CHARS:
+                    yield "\n".join(block)
+                    block, size = [], 0
+        if block:
+            yield "\n".join(block)
+
+def text_pages(file):
+    """Stream a text file in blocks of whole lines"""
+    reader = io.TextIOWrapper(file, encoding="utf-8", errors="replace")
+    try:
+        block, size = [], 0
+        for line in reader:
+            block.append(line)
+            size += len(line)
+            if size >= TEXT_PAGE_CHARS:
+                yield "".join(block)
+                block, size = [], 0
+        if block:
+            yield "".join(block)
+    finally:
+        # Leave the caller's file open
+        reader.detach()
+
+def iter_pages(file_name, file):
+    """Yield the text of a PDF, DOCX or TXT file page by page"""
+    file.seek(0)
+    name = file_name.lower()
+    if name.endswith(".pdf"):
+        return pdf_pages(file)
+    if name.endswith(".docx"):
+        return docx_pages(file)
+    return text_pages(file)
+
+def extract_pages(file_name, file, max_chars=INLINE_DOCUMENT_MAX_CHARS):
+    """Return the text of every page, or None as soon as the text passes max_chars
+
+    Reading stops at the limit, so a long document costs no more than a short one.
+    """
+    pages, total = [], 0
+    for page in iter_pages(file_name, file):
+        pages.append(page)
+        total += len(page)
+        if total > max_chars:
+            return None
+    return pages
+
+def trim_pages(pages):
+    """Drop blank lines, surplus whitespace and lines repeated on most pages (headers, footers)"""
+    pages = [[" ".join(line.split()) for line in page.splitlines()] for page in pages]
+    pages = [[line for line in page if line] for page in pages]
+    repeated = set()
+    if len(pages) >= 3:
+        counts = Counter(line for page in pages for line in set(page))
+        repeated = {line for line, count in counts.items() if count > len(pages) / 2}
+    return ["\n".join(line for line in page if line not in repeated) for page in pages]
+
+def chunk_pages(pages, size=CHUNK_CHARS):
+    """Split page texts into chunks of about size characters at line boundaries"""
+    chunks = []
+    for number, page in enumerate(pages, start=1):
+        block, length = [], 0
+        for line in page.splitlines():
+            if block and length + len(line) > size:
+                chunks.append({"page": number, "text": "\n".join(block)})
+                block, length = [], 0
+            block.append(line)
+            length += len(line) + 1
+        if block:
+            chunks.append({"page": number, "text": "\n".join(block)})
+    return chunks
+
+def format_document(file_name, chunks):
+    """The document's text for the message, with page markers for multi-page documents"""
+    lines = [f"Contents of {file_name}:"]
+    multi_page = len({chunk["page"] for chunk in chunks}) > 1
+    page = None
+    for chunk in chunks:
+        if multi_page and chunk["page"] != page:
+            page = chunk["page"]
+            lines.append(f"[page {page}]")
+        lines.append(chunk["text"])
+    return "\n".join(lines)
+
+class ExtractionCache:
+    """Extracted document text by content hash, one JSON file per document"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def get(self, digest):
+        try:
+            with open(self.path(digest), "r") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Extraction cache error: {e}")
+            return None
+        return entry if entry.get("version") == EXTRACTION_VERSION else None
+
+    def put(self, digest, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_json_atomic(self.path(digest), dict(entry, version=EXTRACTION_VERSION))
+
+    def document_text(self, file_name, file, digest, max_chars=INLINE_DOCUMENT_MAX_CHARS):
+        """Text to inline for a document, or None if it is too long (or has no text) to inline"""
+        entry = self.get(digest)
+        # A document found too long under a lower limit may fit a higher one
+        if entry is None or (entry["chunks"] is None and entry["max_chars"] < max_chars):
+            try:
+                pages = extract_pages(file_name, file, max_chars)
+            except Exception as e:
+                print(f"Could not extract {file_name}: {e}")
+                pages = None
+            finally:
+                file.seek(0)
+            entry = {"chunks": chunk_pages(trim_pages(pages)) if pages else None, "max_chars": max_chars}
+            self.put(digest, entry)
+
+        # Documents without text (e.g. scanned PDFs) are left to the upload as well
+        if not entry["chunks"] or sum(len(chunk["text"]) for chunk in entry["chunks"]) > max_chars:
+            return None
+        return format_document(file_name, entry["chunks"])
@@ -0,0 +1,537 @@
+"""In-process stand-in for the parts of the OpenAI Assistants API used by this app
+
+FakeOpenAI answers like the real client (threads, messages, runs with polling or
+streaming, requires_action tool calls, chat completions, files, multipart uploads and
+vector stores) with configurable latency, and counts every call, so latency and
+round-trips can be measured offline.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+class FakeAPIError(Exception):
+    pass
+
+class FakePage(SimpleNamespace):
+    """A cursor page that, like the real one, iterates over its items"""
+
+    def __iter__(self):
+        return iter(self.data)
+
+class FakeBackend:
+    """Shared state and behaviour behind every FakeOpenAI resource
+
+    latency: seconds added to every call; latencies overrides it per operation,
+        e.g. {"files.create": 0.3}
+    run_phases: (status, seconds) steps a run goes through before it finishes
+    tool_calls: (function name, arguments) the first run segment asks for via requires_action
+    final_status: status a run ends with once its phases (and tool calls) are done
+    response_text: assistant reply, streamed in response_chunks pieces
+    indexing_seconds: time a vector store file batch stays in_progress
+    """
+
+    def __init__(self, latency=0.02, latencies=None, run_phases=(("queued", 0.1), ("in_progress", 1.0)),
+                 tool_calls=(), final_status="completed", response_text="This is a fake evaluation. Overall score: 7/10.",
+                 response_chunks=20, indexing_seconds=0.5):
+        self.latency = latency
+        self.latencies = latencies or {}
+        self.run_phases = list(run_phases)
+        self.tool_calls = list(tool_calls)
+        self.final_status = final_status
+        self.response_text = response_text
+        self.response_chunks = response_chunks
+        self.indexing_seconds = indexing_seconds
+
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.calls = Counter()
+        self.assistants = {}
+        self.threads = {}
+        self.messages = {}
+        self.runs = {}
+        self.files = {}
+        self.vector_stores = {}
+        self.batches = {}
+        self.uploads = {}
+
+    def call(self, operation):
+        """Record one API call and wait for its latency"""
+        with self.lock:
+            self.calls[operation] += 1
+        time.sleep(self.latencies.get(operation, self.latency))
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls.clear()
+
+    @property
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def new_id(self, prefix):
+        # Zero-padded so ids sort in creation order, like cursor ids
+        return f"{prefix}_{next(self.ids):08d}"
+
+    def get(self, table, key, kind):
+        if key not in table:
+            raise FakeAPIError(f"No {kind} found with id '{key}'")
+        return table[key]
+
+    def add_message(self, thread_id, role, text, run_id=None, attachments=None, message_id=None, metadata=None):
+        message = SimpleNamespace(
+            id=message_id or self.new_id("msg"),
+            object="thread.message",
+            thread_id=thread_id,
+            role=role,
+            run_id=run_id,
+            status="completed",
+            created_at=int(time.time()),
+            attachments=attachments or [],
+            metadata=metadata or {},
+            content=[SimpleNamespace(type="text", text=SimpleNamespace(value=text, annotations=[]))]
+        )
+        with self.lock:
+            self.messages[thread_id].append(message)
+        return message
+
+    def run_status(self, run):
+        """Advance a run along its phases according to the time since it (re)started"""
+        if run.streaming or run.status in ("completed", "failed", "expired", "cancelled", "incomplete", "requires_action"):
+            return run
+        elapsed = time.monotonic() - run.started
+        for status, seconds in run.phases:
+            if elapsed < seconds:
+                run.status = status
+                return run
+            elapsed -= seconds
+        self.finish_segment(run)
+        return run
+
+    def finish_segment(self, run, message_id=None):
+        """End the current run segment with tool calls, or with the final status"""
+        if run.pending_tool_calls:
+            run.status = "requires_action"
+            run.required_action = SimpleNamespace(
+                type="submit_tool_outputs",
+                submit_tool_outputs=SimpleNamespace(tool_calls=run.pending_tool_calls)
+            )
+            return
+        run.status = self.final_status
+        run.required_action = None
+        if run.status == "completed":
+            run.usage = SimpleNamespace(prompt_tokens=1200, completion_tokens=len(self.response_text.split()),
+                                        total_tokens=1200 + len(self.response_text.split()))
+            self.add_message(run.thread_id, "assistant", self.response_text, run_id=run.id, message_id=message_id)
+
+    def create_run(self, thread_id, assistant_id, **options):
+        self.get(self.threads, thread_id, "thread")
+        with self.lock:
+            active = [run for run in self.runs.values()
+                      if run.thread_id == thread_id and run.status in ("queued", "in_progress", "requires_action")]
+        if active:
+            raise FakeAPIError(f"Thread {thread_id} already has an active run {active[0].id}")
+        run = SimpleNamespace(
+            id=self.new_id("run"),
+            object="thread.run",
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            status="queued",
+            instructions=options.get("instructions"),
+            model=options.get("model"),
+            truncation_strategy=options.get("truncation_strategy"),
+            required_action=None,
+            usage=None,
+            streaming=False,
+            started=time.monotonic(),
+            phases=list(self.run_phases),
+            pending_tool_calls=[
+                SimpleNamespace(
+                    id=self.new_id("call"),
+                    type="function",
+                    function=SimpleNamespace(name=name, arguments=json.dumps(arguments))
+                )
+                for name, arguments in self.tool_calls
+            ]
+        )
+        with self.lock:
+            self.runs[run.id] = run
+        return run
+
+    def submit_tool_outputs(self, run, tool_outputs):
+        if run.status != "requires_action":
+            raise FakeAPIError(f"Run {run.id} is not waiting for tool outputs")
+        expected = {tool_call.id for tool_call in run.pending_tool_calls}
+        if {output["tool_call_id"] for output in tool_outputs} != expected:
+            raise FakeAPIError("Tool outputs do not match the requested tool calls")
+        run.pending_tool_calls = []
+        run.required_action = None
+        run.status = "in_progress"
+        run.started = time.monotonic()
+        run.streaming = False
+        # After tool outputs the run only needs to write its answer
+        run.phases = [("in_progress", self.run_phases[-1][1] if self.run_phases else 0)]
+        return run
+
+    def stream_run(self, run):
+        """Yield the events of a run segment, spreading text deltas over its duration"""
+        # The stream drives the run itself, polling must not advance it as well
+        run.streaming = True
+        yield event("thread.run.created" if run.status == "queued" else "thread.run.in_progress", run)
+        phases = list(run.phases)
+        # Wait out everything but the last phase, during which the text is written
+        for status, seconds in phases[:-1]:
+            run.status = status
+            yield event(f"thread.run.{status}", run)
+            time.sleep(seconds)
+
+        writing_seconds = phases[-1][1] if phases else 0
+        run.status = "in_progress"
+        yield event("thread.run.in_progress", run)
+        if run.pending_tool_calls:
+            time.sleep(writing_seconds)
+            self.finish_segment(run)
+            yield event("thread.run.requires_action", run)
+            return
+
+        message_id = self.new_id("msg")
+        if self.final_status == "completed":
+            chunks = split_text(self.response_text, self.response_chunks)
+            for chunk in chunks:
+                time.sleep(writing_seconds / max(len(chunks), 1))
+                yield event("thread.message.delta", SimpleNamespace(
+                    id=message_id,
+                    delta=SimpleNamespace(content=[SimpleNamespace(
+                        index=0, type="text", text=SimpleNamespace(value=chunk, annotations=None)
+                    )])
+                ))
+        else:
+            time.sleep(writing_seconds)
+        self.finish_segment(run, message_id)
+        yield event(f"thread.run.{run.status}", run)
+
+def event(name, data):
+    return SimpleNamespace(event=name, data=data)
+
+def split_text(text, pieces):
+    size = max(len(text) // max(pieces, 1), 1)
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+class FakeStream:
+    """Iterable, closable event stream like openai.Stream"""
+
+    def __init__(self, events):
+        self.events = events
+
+    def __iter__(self):
+        return self.events
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.events.close()
+
+class Resource:
+    def __init__(self, backend):
+        self.backend = backend
+
+class Assistants(Resource):
+    def create(self, **options):
+        self.backend.call("beta.assistants.create")
+        options["tools"] = tools_namespace(options.get("tools"))
+        assistant = SimpleNamespace(id=self.backend.new_id("asst"), object="assistant", **options)
+        self.backend.assistants[assistant.id] = assistant
+        return assistant
+
+    def retrieve(self, assistant_id):
+        self.backend.call("beta.assistants.retrieve")
+        return self.backend.get(self.backend.assistants, assistant_id, "assistant")
+
+class Messages(Resource):
+    def create(self, thread_id, role, content, attachments=None, metadata=None, **options):
+        self.backend.call("beta.threads.messages.create")
+        self.backend.get(self.backend.threads, thread_id, "thread")
+        if not isinstance(content, str):
+            content = "".join(part["text"] for part in content if part.get("type") == "text")
+        return self.backend.add_message(thread_id, role, content, attachments=attachments, metadata=metadata)
+
+    def list(self, thread_id, order="desc", limit=20, after=None, before=None, run_id=None, **options):
+        self.backend.call("beta.threads.messages.list")
+        messages = list(self.backend.get(self.backend.messages, thread_id, "thread"))
+        if run_id:
+            messages = [message for message in messages if message.run_id == run_id]
+        if order == "desc":
+            messages.reverse()
+        ids = [message.id for message in messages]
+        if after:
+            messages = messages[ids.index(after) + 1:] if after in ids else []
+        if before:
+            messages = messages[:ids.index(before)] if before in ids else messages
+        return FakePage(data=messages[:limit], has_more=len(messages) > limit)
+
+class Runs(Resource):
+    def create(self, thread_id, assistant_id, stream=False, **options):
+        self.backend.call("beta.threads.runs.create")
+        run = self.backend.create_run(thread_id, assistant_id, **options)
+        if stream:
+            return FakeStream(self.backend.stream_run(run))
+        return run
+
+    def retrieve(self, run_id, thread_id):
+        self.backend.call("beta.threads.runs.retrieve")
+        return self.backend.run_status(self.backend.get(self.backend.runs, run_id, "run"))
+
+    def list(self, thread_id, limit=20, **options):
+        self.backend.call("beta.threads.runs.list")
+        runs = [run for run in self.backend.runs.values() if run.thread_id == thread_id]
+        runs = [self.backend.run_status(run) for run in reversed(runs)]
+        return FakePage(data=runs[:limit], has_more=len(runs) > limit)
+
+    def submit_tool_outputs(self, run_id, thread_id, tool_outputs, stream=False):
+        self.backend.call("beta.threads.runs.submit_tool_outputs")
+        run = self.backend.submit_tool_outputs(self.backend.get(self.backend.runs, run_id, "run"), tool_outputs)
+        if stream:
+            return FakeStream(self.backend.stream_run(run))
+        return run
+
+    def cancel(self, run_id, thread_id):
+        self.backend.call("beta.threads.runs.cancel")
+        run = self.backend.get(self.backend.runs, run_id, "run")
+        run.status = "cancelled"
+        return run
+
+def tools_namespace(tools):
+    """Assistant tools as returned by the API, from the dicts passed in"""
+    return [
+        SimpleNamespace(type=tool["type"], function=SimpleNamespace(**tool["function"]) if "function" in tool else None)
+        for tool in tools or []
+    ]
+
+def tool_resources_namespace(tool_resources):
+    """Thread tool_resources as returned by the API, from the dict passed in"""
+    if not tool_resources:
+        return None
+    file_search = tool_resources.get("file_search")
+    code_interpreter = tool_resources.get("code_interpreter")
+    return SimpleNamespace(
+        file_search=SimpleNamespace(vector_store_ids=file_search.get("vector_store_ids", [])) if file_search else None,
+        code_interpreter=SimpleNamespace(file_ids=code_interpreter.get("file_ids", [])) if code_interpreter else None
+    )
+
+class Threads(Resource):
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.messages = Messages(backend)
+        self.runs = Runs(backend)
+
+    def create(self, messages=None, **options):
+        self.backend.call("beta.threads.create")
+        thread = SimpleNamespace(
+            id=self.backend.new_id("thread"),
+            object="thread",
+            tool_resources=tool_resources_namespace(options.get("tool_resources")),
+            metadata=options.get("metadata")
+        )
+        self.backend.threads[thread.id] = thread
+        self.backend.messages[thread.id] = []
+        for message in messages or []:
+            self.backend.add_message(thread.id, message["role"], message["content"])
+        return thread
+
+    def retrieve(self, thread_id):
+        self.backend.call("beta.threads.retrieve")
+        return self.backend.get(self.backend.threads, thread_id, "thread")
+
+    def update(self, thread_id, tool_resources=None, **options):
+        self.backend.call("beta.threads.update")
+        thread = self.backend.get(self.backend.threads, thread_id, "thread")
+        if tool_resources:
+            thread.tool_resources = tool_resources_namespace(tool_resources)
+        return thread
+
+class Beta:
+    def __init__(self, backend):
+        self.assistants = Assistants(backend)
+        self.threads = Threads(backend)
+
+class Completions(Resource):
+    def create(self, model, messages, **options):
+        self.backend.call("chat.completions.create")
+        message = SimpleNamespace(role="assistant", content=self.backend.response_text)
+        prompt_tokens = sum(len(str(m["content"])) for m in messages) // 4
+        return SimpleNamespace(
+            id=self.backend.new_id("chatcmpl"), object="chat.completion", model=model,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(message.content) // 4,
+                                  total_tokens=prompt_tokens + len(message.content) // 4)
+        )
+
+class Chat:
+    def __init__(self, backend):
+        self.completions = Completions(backend)
+
+class Files(Resource):
+    def create(self, file, purpose):
+        self.backend.call("files.create")
+        file_name, content = file if isinstance(file, tuple) else (getattr(file, "name", "upload"), file)
+        data = content.read() if hasattr(content, "read") else bytes(content)
+        uploaded = SimpleNamespace(id=self.backend.new_id("file"), object="file", filename=file_name,
+                                   bytes=len(data), purpose=purpose)
+        self.backend.files[uploaded.id] = uploaded
+        return uploaded
+
+    def retrieve(self, file_id):
+        self.backend.call("files.retrieve")
+        return self.backend.get(self.backend.files, file_id, "file")
+
+class UploadParts(Resource):
+    def create(self, upload_id, data):
+        self.backend.call("uploads.parts.create")
+        upload = self.backend.get(self.backend.uploads, upload_id, "upload")
+        if upload.status != "pending":
+            raise FakeAPIError(f"Upload {upload_id} is {upload.status}")
+        part = SimpleNamespace(id=self.backend.new_id("part"), object="upload.part", upload_id=upload_id)
+        upload.parts[part.id] = len(data[1] if isinstance(data, tuple) else data)
+        return part
+
+class Uploads(Resource):
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.parts = UploadParts(backend)
+
+    def create(self, bytes, filename, mime_type, purpose):
+        self.backend.call("uploads.create")
+        upload = SimpleNamespace(id=self.backend.new_id("upload"), object="upload", bytes=bytes, filename=filename,
+                                 purpose=purpose, status="pending", expires_at=int(time.time()) + 3600, file=None,
+                                 parts={})
+        self.backend.uploads[upload.id] = upload
+        return upload
+
+    def complete(self, upload_id, part_ids):
+        self.backend.call("uploads.complete")
+        upload = self.backend.get(self.backend.uploads, upload_id, "upload")
+        if any(part_id not in upload.parts for part_id in part_ids):
+            raise FakeAPIError(f"Upload {upload_id} has no such part")
+        if sum(upload.parts[part_id] for part_id in part_ids) != upload.bytes:
+            raise FakeAPIError(f"Parts of upload {upload_id} do not add up to {upload.bytes} bytes")
+        upload.status = "completed"
+        upload.file = SimpleNamespace(id=self.backend.new_id("file"), object="file", filename=upload.filename,
+                                      bytes=upload.bytes, purpose=upload.purpose)
+        self.backend.files[upload.file.id] = upload.file
+        return upload
+
+class FileBatches(Resource):
+    def create(self, vector_store_id, file_ids=None, **options):
+        self.backend.call("vector_stores.file_batches.create")
+        vector_store = self.backend.get(self.backend.vector_stores, vector_store_id, "vector store")
+        batch = SimpleNamespace(id=self.backend.new_id("vsfb"), vector_store_id=vector_store_id,
+                                status="in_progress", file_ids=list(file_ids or []), started=time.monotonic(),
+                                file_counts=SimpleNamespace(in_progress=len(file_ids or []), completed=0, failed=0))
+        vector_store.file_ids.extend(batch.file_ids)
+        self.backend.batches[batch.id] = batch
+        return batch
+
+    def retrieve(self, batch_id, vector_store_id):
+        self.backend.call("vector_stores.file_batches.retrieve")
+        batch = self.backend.get(self.backend.batches, batch_id, "file batch")
+        if batch.status == "in_progress" and time.monotonic() - batch.started >= self.backend.indexing_seconds:
+            batch.status = "completed"
+            batch.file_counts = SimpleNamespace(in_progress=0, completed=len(batch.file_ids), failed=0)
+        return batch
+
+    def list_files(self, batch_id, vector_store_id, **options):
+        self.backend.call("vector_stores.file_batches.list_files")
+        batch = self.backend.get(self.backend.batches, batch_id, "file batch")
+        return FakePage(data=[SimpleNamespace(id=file_id) for file_id in batch.file_ids], has_more=False)
+
+class VectorStoreFiles(Resource):
+    def list(self, vector_store_id, **options):
+        self.backend.call("vector_stores.files.list")
+        vector_store = self.backend.get(self.backend.vector_stores, vector_store_id, "vector store")
+        return FakePage(data=[SimpleNamespace(id=file_id) for file_id in vector_store.file_ids], has_more=False)
+
+class VectorStores(Resource):
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.file_batches = FileBatches(backend)
+        self.files = VectorStoreFiles(backend)
+
+    def create(self, **options):
+        self.backend.call("vector_stores.create")
+        vector_store = SimpleNamespace(id=self.backend.new_id("vs"), object="vector_store", file_ids=[], **options)
+        self.backend.vector_stores[vector_store.id] = vector_store
+        return vector_store
+
+class FakeOpenAI:
+    """Drop-in replacement for openai.OpenAI backed by a FakeBackend
+
+    Accepts (and ignores) the real client's arguments, so it can be patched in for
+    openai.OpenAI. Pass backend= to share state or use non-default behaviour.
+    """
+
+    def __init__(self, *args, backend=None, **kwargs):
+        self.backend = backend or FakeBackend()
+        self.beta = Beta(self.backend)
+        self.chat = Chat(self.backend)
+        self.files = Files(self.backend)
+        self.uploads = Uploads(self.backend)
+        self.vector_stores = VectorStores(self.backend)
+
+class AsyncFakeStream:
+    """Async iterable, closable event stream like openai.AsyncStream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.events = iter(stream)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        # The fake sleeps to simulate latency, so events are produced off the event loop
+        event = await asyncio.to_thread(next, self.events, None)
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await asyncio.to_thread(self.stream.close)
+
+class AsyncResource:
+    """Async view of a fake resource: every method is awaitable"""
+
+    def __init__(self, target):
+        self.target = target
+
+    def __getattr__(self, name):
+        value = getattr(self.target, name)
+        if isinstance(value, Resource) or isinstance(value, Beta):
+            return AsyncResource(value)
+        if not callable(value):
+            return value
+
+        async def call(*args, **kwargs):
+            result = await asyncio.to_thread(value, *args, **kwargs)
+            return AsyncFakeStream(result) if isinstance(result, FakeStream) else result
+        return call
+
+class AsyncFakeOpenAI(AsyncResource):
+    """Drop-in replacement for openai.AsyncOpenAI backed by a FakeBackend"""
+
+    def __init__(self, *args, backend=None, **kwargs):
+        super().__init__(FakeOpenAI(backend=backend))
+        self.backend = self.target.backend
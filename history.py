@@ -0,0 +1,86 @@
+import json
+import os
+from utils import get_message_text, write_json_atomic
+
+# Messages fetched per request, the API maximum
+HISTORY_PAGE_SIZE = 100
+
+class ThreadHistory:
+    """Local copy of a thread's messages, oldest first, kept in sync incrementally
+
+    The copy is saved as one JSON file per thread, so a reopened conversation only
+    fetches the messages added since it was last seen.
+    """
+
+    def __init__(self, cache_dir, thread_id):
+        self.thread_id = thread_id
+        self.path = os.path.join(cache_dir, f"{thread_id}.json")
+        self.messages = self.load()
+
+    def load(self):
+        """Read the cached messages, starting empty if there is no usable cache"""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            print(f"History cache error: {e}")
+            return []
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_json_atomic(self.path, self.messages)
+
+    @property
+    def last_id(self):
+        return self.messages[-1]["id"] if self.messages else None
+
+    def has_changed(self, client):
+        """Check with a single one-message request whether the thread has new messages"""
+        page = client.beta.threads.messages.list(
+            thread_id=self.thread_id,
+            order="desc",
+            limit=1
+        )
+        latest_id = page.data[0].id if page.data else None
+        return latest_id != self.last_id
+
+    def sync(self, client):
+        """Fetch every message newer than the last cached one, following pagination
+
+        Returns the newly added messages.
+        """
+        new_messages = []
+        after = self.last_id
+        while True:
+            params = {"thread_id": self.thread_id, "order": "asc", "limit": HISTORY_PAGE_SIZE}
+            if after:
+                params["after"] = after
+            page = client.beta.threads.messages.list(**params)
+
+            reached_in_progress = False
+            for message in page.data:
+                # A message that is still being written would never be refreshed, stop before it
+                if message.status == "in_progress":
+                    reached_in_progress = True
+                    break
+                new_messages.append({
+                    "id": message.id,
+                    "role": message.role,
+                    "content": get_message_text(message),
+                    "run_id": message.run_id,
+                    "metadata": dict(message.metadata or {})
+                })
+
+            if reached_in_progress or not page.has_more or not page.data:
+                break
+            after = page.data[-1].id
+
+        if new_messages:
+            self.messages.extend(new_messages)
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Failed to save history cache: {e}")
+        return new_messages
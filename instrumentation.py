@@ -0,0 +1,253 @@
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# Finished spans kept per session, the oldest are dropped first
+MAX_SPANS = 2000
+
+# Request arguments and response fields copied onto API call spans
+ID_ARGUMENTS = ["thread_id", "run_id", "assistant_id", "vector_store_id", "batch_id", "file_id"]
+USAGE_FIELDS = ["prompt_tokens", "completion_tokens", "total_tokens"]
+
+# Spans open in each thread; a thread only ever works for one session at a time, so
+# client layers below the tracer (e.g. retries) can find the span of the current call
+active = threading.local()
+
+def open_spans():
+    if not hasattr(active, "spans"):
+        active.spans = []
+    return active.spans
+
+def current_span():
+    spans = open_spans()
+    return spans[-1] if spans else None
+
+def note_retry():
+    """Count a retry against the span open in this thread, if any"""
+    span = current_span()
+    if span:
+        span.retries += 1
+
+class Span:
+    """One timed operation: an API call, or an app phase grouping several calls"""
+
+    def __init__(self, name, parent_id=None, attributes=None):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.retries = 0
+        self.error = None
+        self.start_time = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def to_dict(self, trace_id):
+        """OpenTelemetry-style span record"""
+        attributes = dict(self.attributes, retries=self.retries)
+        return {
+            "trace_id": trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": int(self.start_time * 1e9),
+            "end_time_unix_nano": int((self.start_time + (self.duration or 0)) * 1e9),
+            "attributes": attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"}
+        }
+
+class Tracer:
+    """Collect the spans of one session; safe to use from worker threads"""
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = deque(maxlen=max_spans)
+        self.lock = threading.Lock()
+
+    def start_span(self, name, **attributes):
+        # Parents come from the spans open in this thread, so they never cross threads
+        parent = current_span()
+        span = Span(name, parent.span_id if parent else None)
+        span.set(**attributes)
+        return span
+
+    def end_span(self, span, error=None):
+        span.duration = time.perf_counter() - span.started
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        with self.lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time a block; API calls made inside it in the same thread become its children"""
+        span = self.start_span(name, **attributes)
+        spans = open_spans()
+        spans.append(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            spans.remove(span)
+            self.end_span(span, error)
+
+    def finished(self):
+        with self.lock:
+            return list(self.spans)
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+
+    def operation_summary(self):
+        """Calls, total and slowest time, and retries per span name, slowest total first"""
+        summary = {}
+        for span in self.finished():
+            row = summary.setdefault(span.name, {"operation": span.name, "calls": 0, "total_s": 0.0,
+                                                 "max_s": 0.0, "retries": 0, "errors": 0})
+            row["calls"] += 1
+            row["total_s"] += span.duration
+            row["max_s"] = max(row["max_s"], span.duration)
+            row["retries"] += span.retries
+            row["errors"] += span.error is not None
+        return sorted(summary.values(), key=lambda row: row["total_s"], reverse=True)
+
+    def run_summary(self):
+        """Per-run polls, time spent polling and token usage"""
+        runs = {}
+        for span in self.finished():
+            run_id = span.attributes.get("run_id")
+            if not run_id:
+                continue
+            row = runs.setdefault(run_id, {"run_id": run_id, "thread_id": span.attributes.get("thread_id"),
+                                           "status": None, "polls": 0, "poll_s": 0.0, "total_tokens": None})
+            if span.name.endswith("runs.retrieve"):
+                row["polls"] += 1
+                row["poll_s"] += span.duration
+            row["status"] = span.attributes.get("status", row["status"])
+            row["total_tokens"] = span.attributes.get("total_tokens", row["total_tokens"])
+        return list(runs.values())
+
+    def export_jsonl(self):
+        return "".join(json.dumps(span.to_dict(self.trace_id)) + "\n" for span in self.finished())
+
+def describe_result(span, result):
+    """Copy the id, status and token usage of an API response onto its span"""
+    status = getattr(result, "status", None)
+    if isinstance(status, str):
+        span.set(status=status)
+    if getattr(result, "object", None) == "thread.run":
+        span.set(run_id=result.id, thread_id=result.thread_id)
+    usage = getattr(result, "usage", None)
+    if usage is not None:
+        span.set(**{field: getattr(usage, field, None) for field in USAGE_FIELDS})
+
+class TracedStream:
+    """Event stream wrapper that ends its span when the stream is exhausted or closed"""
+
+    def __init__(self, stream, tracer, span):
+        self.stream = stream
+        self.tracer = tracer
+        self.span = span
+        self.events = 0
+        self.ended = False
+
+    def __iter__(self):
+        error = None
+        try:
+            for event in self.stream:
+                if self.events == 0:
+                    self.span.set(first_event_s=time.perf_counter() - self.span.started)
+                self.events += 1
+                if event.event.startswith("thread.run."):
+                    describe_result(self.span, event.data)
+                yield event
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.end(error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.stream.close()
+        self.end()
+
+    def end(self, error=None):
+        if not self.ended:
+            self.ended = True
+            self.span.set(events=self.events)
+            self.tracer.end_span(self.span, error)
+
+class ClientProxy:
+    """Proxy for an OpenAI client (or any of its resources) that wraps every method call
+
+    Attribute access is forwarded, so client.beta.threads.runs.create(...) works as usual;
+    subclasses implement wrap(method, path) with path like "beta.threads.runs.create".
+    """
+
+    def __init__(self, target, path=""):
+        self._target = target
+        self._path = path
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        path = f"{self._path}.{name}" if self._path else name
+        if callable(value):
+            return self.wrap(value, path)
+        if isinstance(value, (str, int, float, bool, type(None))):
+            return value
+        return self.child(value, path)
+
+    def child(self, target, path):
+        return type(self)(target, path=path)
+
+    def wrap(self, method, path):
+        return method
+
+class InstrumentedClient(ClientProxy):
+    """Client proxy that records a span per API call in a session's tracer"""
+
+    def __init__(self, target, tracer, path=""):
+        super().__init__(target, path)
+        self._tracer = tracer
+
+    def child(self, target, path):
+        return InstrumentedClient(target, self._tracer, path)
+
+    def wrap(self, method, path):
+        def call(*args, **kwargs):
+            span = self._tracer.start_span(path, **{key: kwargs.get(key) for key in ID_ARGUMENTS})
+            if args and isinstance(args[0], str):
+                # e.g. threads.retrieve(thread_id) or file_batches.create(vector_store_id)
+                span.set(target_id=args[0])
+            # Open while the call runs, so retries below this layer are counted on it
+            spans = open_spans()
+            spans.append(span)
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                self._tracer.end_span(span, e)
+                raise
+            finally:
+                spans.remove(span)
+            if kwargs.get("stream"):
+                return TracedStream(result, self._tracer, span)
+            describe_result(span, result)
+            self._tracer.end_span(span)
+            return result
+        return call
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import openai
+from instrumentation import ClientProxy, note_retry
+from utils import backoff_intervals
+
+# Requests per second allowed across every session in the process, and the burst size
+API_REQUESTS_PER_SECOND = 8
+API_BURST = 16
+
+# Retries allowed per call, by operation
+RETRY_BUDGETS = {
+    "beta.threads.runs.retrieve": 5,
+    "beta.threads.runs.list": 5,
+    "beta.threads.messages.list": 5,
+    "files.create": 4,
+    "uploads.parts.create": 4,
+    "beta.threads.runs.create": 2
+}
+DEFAULT_RETRY_BUDGET = 3
+# Creating calls that are safe to repeat: a part sent twice is just left out of the completed upload
+REPEATABLE_OPERATIONS = ("uploads.parts.create",)
+# Backoff between retries when the API doesn't say how long to wait
+RETRY_INITIAL_INTERVAL = 0.5
+RETRY_MAX_INTERVAL = 30.0
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all callers in the process"""
+
+    def __init__(self, rate=API_REQUESTS_PER_SECOND, capacity=API_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Take a token if one is available, otherwise return how long to wait for one"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        """Block until a request may be made"""
+        while (wait := self.take()) is not None:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait without blocking the event loop until a request may be made"""
+        while (wait := self.take()) is not None:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every caller back, e.g. after the API answered 429 with Retry-After"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            # Start empty afterwards, so waiting callers resume at the rate instead of in a burst
+            self.tokens = 0
+            self.updated = self.paused_until
+
+def retry_after(error):
+    """Seconds the API asked us to wait before retrying, or None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(operation, error):
+    """Whether a failed call can safely be made again"""
+    if isinstance(error, openai.RateLimitError):
+        # Rejected before it was processed, so even creating calls can be repeated,
+        # unless the account is out of quota, which waiting doesn't fix
+        return error.code != "insufficient_quota"
+    creates = operation.endswith(".create") or operation.endswith(".submit_tool_outputs")
+    if creates and operation not in REPEATABLE_OPERATIONS:
+        # The request may have gone through; repeating it could duplicate messages or runs
+        return False
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in (408, 409)
+
+class RateLimitedClient(ClientProxy):
+    """Client proxy that rate limits every call and retries transient failures
+
+    Retries back off exponentially with jitter, or wait as long as the API's Retry-After
+    asks, and stop at the operation's retry budget. Make the wrapped client with
+    max_retries=0 so retries are not doubled.
+    """
+
+    def __init__(self, target, limiter=None, budgets=None, path=""):
+        super().__init__(target, path)
+        self._limiter = limiter or TokenBucket()
+        self._budgets = RETRY_BUDGETS if budgets is None else budgets
+
+    def child(self, target, path):
+        return RateLimitedClient(target, self._limiter, self._budgets, path)
+
+    def retry_delay(self, path, error, attempt, intervals):
+        """Seconds to wait before retrying a failed call, or None if it must not be retried"""
+        budget = self._budgets.get(path, DEFAULT_RETRY_BUDGET)
+        if attempt >= budget or not is_retryable(path, error):
+            return None
+        delay = retry_after(error)
+        if delay is not None and isinstance(error, openai.RateLimitError):
+            # Over the account's limit, so every session has to slow down
+            self._limiter.pause(delay)
+        delay = max(delay or 0.0, next(intervals))
+        note_retry()
+        print(f"Retrying {path} in {delay:.1f}s (attempt {attempt + 1} of {budget}): {error}")
+        return delay
+
+    def wrap(self, method, path):
+        def call(*args, **kwargs):
+            intervals = backoff_intervals(RETRY_INITIAL_INTERVAL, RETRY_MAX_INTERVAL, factor=2.0, jitter=0.5)
+            attempt = 0
+            while True:
+                self._limiter.acquire()
+                try:
+                    return method(*args, **kwargs)
+                except openai.APIError as e:
+                    delay = self.retry_delay(path, e, attempt, intervals)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                time.sleep(delay)
+        return call
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    """RateLimitedClient for openai.AsyncOpenAI, waiting without blocking the event loop
+
+    Give it the limiter of the process's other clients so they all share one rate.
+    """
+
+    def child(self, target, path):
+        return AsyncRateLimitedClient(target, self._limiter, self._budgets, path)
+
+    def wrap(self, method, path):
+        async def call(*args, **kwargs):
+            intervals = backoff_intervals(RETRY_INITIAL_INTERVAL, RETRY_MAX_INTERVAL, factor=2.0, jitter=0.5)
+            attempt = 0
+            while True:
+                await self._limiter.acquire_async()
+                try:
+                    return await method(*args, **kwargs)
+                except openai.APIError as e:
+                    delay = self.retry_delay(path, e, attempt, intervals)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                await asyncio.sleep(delay)
+        return call
@@ -0,0 +1,111 @@
+"""Routing each question to a quick assistant or the full VC evaluator
+
+Full evaluations (file analyses and new proposals) keep the full assistant. Follow-up
+questions go to a lighter, faster one, unless its observed latency says otherwise.
+"""
+import re
+import threading
+from utils import ASSISTANT_MODEL, ASSISTANT_INSTRUCTIONS
+
+QUICK_MODEL = "gpt-4o-mini"
+QUICK_INSTRUCTIONS = """
+        You are a venture capitalist answering follow-up questions about startup proposals
+        discussed earlier in this conversation. Answer briefly and directly, in a few sentences
+        or bullet points, using the conversation and the attached documents. Do not repeat
+        the full evaluation; if the user asks for a new or complete evaluation, say so in one
+        sentence. Refuse requests unrelated to evaluating startups.
+        """
+
+# Assistant settings of each tier, on top of the full evaluator's (see create_assistant)
+ASSISTANT_TIERS = {
+    "quick": {
+        "name": "VC Assistant (quick answers)",
+        "model": QUICK_MODEL,
+        "instructions": QUICK_INSTRUCTIONS,
+        # The code_interpreter sandbox is what makes runs slow to start
+        "tools": [{"type": "file_search"}],
+        "temperature": 0.3
+    },
+    "full": {}
+}
+# Messages longer than this are taken for proposals, which get the full evaluation
+QUICK_MAX_CHARS = 400
+# Requests for a (new) evaluation rather than a follow-up answer
+EVALUATION_PATTERN = re.compile(
+    r"\b(re-?evaluate|evaluate|assess|full (evaluation|report|analysis)|score (this|it|my|our)|"
+    r"due diligence|business plan|pitch deck|(my|our) (startup|idea|proposal|company))\b",
+    re.IGNORECASE
+)
+# Weight of the latest run in the latency averages
+LATENCY_EWMA_ALPHA = 0.3
+# Runs observed per model before their latency is used for routing
+LATENCY_MIN_SAMPLES = 3
+# Follow-ups go to the full tier while the quick model is not at least this much faster to answer
+QUICK_MAX_LATENCY_RATIO = 0.8
+# While follow-ups are sent to the full tier, every this many still go to the quick one, so
+# its latency keeps being measured and routing can switch back
+QUICK_PROBE_EVERY = 5
+
+def tier_setting(tier, name):
+    """The tier's assistant setting, e.g. "model", falling back to the full evaluator's"""
+    defaults = {"model": ASSISTANT_MODEL, "instructions": ASSISTANT_INSTRUCTIONS}
+    return ASSISTANT_TIERS[tier].get(name, defaults.get(name))
+
+class LatencyStats:
+    """Moving averages of run latency per model, shared by every session in the process"""
+
+    def __init__(self, alpha=LATENCY_EWMA_ALPHA):
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.models = {}
+
+    def record(self, model, first_token_s, total_s):
+        with self.lock:
+            stats = self.models.get(model)
+            if stats is None:
+                self.models[model] = {"runs": 1, "first_token_s": first_token_s, "total_s": total_s}
+                return
+            stats["runs"] += 1
+            stats["first_token_s"] += self.alpha * (first_token_s - stats["first_token_s"])
+            stats["total_s"] += self.alpha * (total_s - stats["total_s"])
+
+    def get(self, model):
+        with self.lock:
+            stats = self.models.get(model)
+            return dict(stats) if stats else None
+
+    def summary(self):
+        """One row per model, for display"""
+        with self.lock:
+            return [{"model": model, **stats} for model, stats in sorted(self.models.items())]
+
+class ModelRouter:
+    """Choose the tier of a question from its text, its files and the models' observed latency"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.diverted = 0
+
+    def choose(self, text, attachments=None, analysis=False, follow_up=True):
+        """Return (tier, reason); follow_up is False for the first question of a conversation"""
+        if analysis or attachments:
+            return "full", "files to analyze"
+        if not follow_up:
+            return "full", "new conversation"
+        if len(text) > QUICK_MAX_CHARS or text.count("\n\n") >= 2:
+            return "full", "reads like a proposal"
+        if EVALUATION_PATTERN.search(text):
+            return "full", "asks for an evaluation"
+
+        # Answer length differs between the tiers, so they are compared on time to first token
+        quick = self.stats.get(tier_setting("quick", "model"))
+        full = self.stats.get(tier_setting("full", "model"))
+        if (quick and full and min(quick["runs"], full["runs"]) >= LATENCY_MIN_SAMPLES
+                and quick["first_token_s"] > full["first_token_s"] * QUICK_MAX_LATENCY_RATIO):
+            with self.lock:
+                self.diverted += 1
+                probe = self.diverted % QUICK_PROBE_EVERY == 0
+            if not probe:
+                return "full", "quick model is currently not faster"
+        return "quick", "follow-up question"
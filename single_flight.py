@@ -0,0 +1,75 @@
+import threading
+
+class SharedStream:
+    """Text chunks of one in-flight evaluation, replayed and followed by any number of readers"""
+
+    def __init__(self):
+        self.chunks = []
+        self.errors = []
+        self.done = False
+        self.condition = threading.Condition()
+
+    def append(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def add_error(self, error):
+        with self.condition:
+            self.errors.append(error)
+
+    def finish(self):
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    @property
+    def text(self):
+        with self.condition:
+            return "".join(self.chunks)
+
+    def __iter__(self):
+        """Yield every chunk from the start, then new chunks as they arrive, until it finishes"""
+        position = 0
+        while True:
+            with self.condition:
+                while position == len(self.chunks) and not self.done:
+                    self.condition.wait()
+                new_chunks = self.chunks[position:]
+                position = len(self.chunks)
+                finished = self.done
+            yield from new_chunks
+            if finished and position == len(self.chunks):
+                return
+
+class SingleFlight:
+    """Coalesce identical evaluations so concurrent requests share one run"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def join(self, key):
+        """Return the shared stream for a key and whether the caller must lead the run"""
+        with self.lock:
+            if key in self.flights:
+                return self.flights[key], False
+            stream = SharedStream()
+            self.flights[key] = stream
+            return stream, True
+
+    def lead(self, key, stream, chunks):
+        """Publish the leader's chunks to the followers while yielding them to the leader"""
+        completed = False
+        try:
+            for chunk in chunks:
+                stream.append(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if not completed:
+                # The leader stopped early (e.g. its session went away), tell the followers
+                stream.add_error("Error: The shared evaluation was interrupted")
+            with self.lock:
+                self.flights.pop(key, None)
+            stream.finish()
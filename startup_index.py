@@ -0,0 +1,197 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from tools import register_tool
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Longer words are truncated so the vocabulary fits a fixed-width, memory-mappable array
+MAX_TERM_LENGTH = 32
+# Bump when the on-disk layout changes so old indexes are rebuilt
+INDEX_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]{2,}")
+STOPWORDS = {
+    "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "its", "of", "on", "or", "our", "that", "the", "their", "to", "we", "with", "your"
+}
+
+# Catalogue columns that are searched, and those returned in results
+TEXT_COLUMNS = ["name", "industry", "categories", "keywords", "description"]
+RESULT_COLUMNS = ["name", "industry", "description", "website"]
+
+def tokenize(text):
+    """Split text into lowercase search terms"""
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+def load_catalogue(path):
+    """Read a startup catalogue from CSV or Parquet with lowercase column names"""
+    if path.lower().endswith(".parquet"):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False)
+    frame.columns = [str(column).strip().lower() for column in frame.columns]
+    if "website" not in frame.columns and "website_url" in frame.columns:
+        frame["website"] = frame["website_url"]
+    if "name" not in frame.columns or "description" not in frame.columns:
+        raise ValueError("Startup catalogue needs at least 'name' and 'description' columns")
+    return frame.fillna("").astype(str)
+
+def build_index(catalogue_path, index_dir):
+    """Build the BM25 index of a catalogue and save it as memory-mappable arrays"""
+    frame = load_catalogue(catalogue_path)
+    columns = [column for column in TEXT_COLUMNS if column in frame.columns]
+    texts = frame[columns[0]].str.cat([frame[column] for column in columns[1:]], sep=" ")
+
+    # Term counts per company as coordinate arrays
+    vocabulary = {}
+    doc_ids, term_ids, counts = [], [], []
+    for doc_id, text in enumerate(texts):
+        for term, count in Counter(tokenize(text)).items():
+            doc_ids.append(doc_id)
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+    doc_ids = np.asarray(doc_ids, dtype=np.int32)
+    term_ids = np.asarray(term_ids, dtype=np.int32)
+    tf = np.asarray(counts, dtype=np.float32)
+
+    # BM25 weight of every (company, term) pair, computed once at build time
+    n_docs = len(frame)
+    doc_lengths = np.bincount(doc_ids, weights=tf, minlength=n_docs)
+    avg_length = doc_lengths.mean() if n_docs else 1.0
+    doc_freq = np.bincount(term_ids, minlength=len(vocabulary))
+    idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc_ids] / avg_length)
+    weights = (idf[term_ids] * tf * (BM25_K1 + 1) / (tf + norm)).astype(np.float32)
+
+    # Terms are sorted so lookups can binary search the memory-mapped vocabulary
+    terms = np.array(sorted(vocabulary), dtype=f"<U{MAX_TERM_LENGTH}")
+    remap = np.empty(len(vocabulary), dtype=np.int32)
+    remap[[vocabulary[term] for term in terms]] = np.arange(len(terms), dtype=np.int32)
+    postings = sparse.csr_matrix(
+        (weights, (remap[term_ids], doc_ids)),
+        shape=(len(terms), n_docs)
+    )
+
+    # Result records are stored as one UTF-8 blob with offsets, decoded only for hits
+    result_columns = [column for column in RESULT_COLUMNS if column in frame.columns]
+    records = [
+        json.dumps(dict(zip(result_columns, values))).encode("utf-8")
+        for values in zip(*(frame[column].tolist() for column in result_columns))
+    ]
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(record) for record in records])
+    blob = np.frombuffer(b"".join(records), dtype=np.uint8)
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, "terms.npy"), terms)
+    np.save(os.path.join(index_dir, "postings_indptr.npy"), postings.indptr.astype(np.int64))
+    np.save(os.path.join(index_dir, "postings_docs.npy"), postings.indices.astype(np.int32))
+    np.save(os.path.join(index_dir, "postings_weights.npy"), postings.data.astype(np.float32))
+    np.save(os.path.join(index_dir, "record_offsets.npy"), offsets)
+    np.save(os.path.join(index_dir, "record_blob.npy"), blob)
+    # Written last, so an interrupted build is never mistaken for a complete index
+    with open(os.path.join(index_dir, "manifest.json"), "w") as f:
+        json.dump(catalogue_fingerprint(catalogue_path), f)
+
+def catalogue_fingerprint(catalogue_path):
+    stat = os.stat(catalogue_path)
+    return {
+        "version": INDEX_VERSION,
+        "catalogue": os.path.abspath(catalogue_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime
+    }
+
+class StartupIndex:
+    """BM25 search over a startup catalogue, backed by memory-mapped arrays"""
+
+    def __init__(self, index_dir):
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+        self.terms = load("terms.npy")
+        self.indptr = load("postings_indptr.npy")
+        self.docs = load("postings_docs.npy")
+        self.weights = load("postings_weights.npy")
+        self.offsets = load("record_offsets.npy")
+        self.blob = load("record_blob.npy")
+        self.size = len(self.offsets) - 1
+
+    @classmethod
+    def open(cls, catalogue_path, index_dir=None):
+        """Open the index of a catalogue, building it first if it is missing or stale"""
+        index_dir = index_dir or f"{os.path.splitext(catalogue_path)[0]}.index"
+        try:
+            with open(os.path.join(index_dir, "manifest.json"), "r") as f:
+                is_current = json.load(f) == catalogue_fingerprint(catalogue_path)
+        except (FileNotFoundError, ValueError):
+            is_current = False
+        if not is_current:
+            build_index(catalogue_path, index_dir)
+        return cls(index_dir)
+
+    def term_id(self, term):
+        position = int(np.searchsorted(self.terms, term))
+        if position < len(self.terms) and self.terms[position] == term:
+            return position
+        return None
+
+    def record(self, doc_id):
+        start, end = self.offsets[doc_id], self.offsets[doc_id + 1]
+        return json.loads(self.blob[start:end].tobytes().decode("utf-8"))
+
+    def search(self, query, k=5):
+        """Return up to k (score, record) pairs for the companies best matching the query"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term, count in Counter(tokenize(query)).items():
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            # Company ids are unique within a posting list, so a plain scatter-add is safe
+            scores[self.docs[start:end]] += count * self.weights[start:end]
+
+        k = min(k, self.size)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[doc_id]), self.record(doc_id)) for doc_id in top if scores[doc_id] > 0]
+
+# Opened by use_startup_catalogue, shared by every session in the process
+index_lock = threading.Lock()
+open_indexes = {}
+
+def get_startup_index(catalogue_path):
+    with index_lock:
+        if catalogue_path not in open_indexes:
+            open_indexes[catalogue_path] = StartupIndex.open(catalogue_path)
+        return open_indexes[catalogue_path]
+
+def use_startup_catalogue(catalogue_path):
+    """Back the find_similar_startups tool with a local index of the catalogue
+
+    The index is opened, and built if the catalogue is new or has changed, before the
+    tool is registered, so building it never counts against a tool call's timeout.
+    """
+    index = get_startup_index(catalogue_path)
+
+    @register_tool("find_similar_startups")
+    def find_similar_startups(business_description, industry=None, keywords=None):
+        # The industry is repeated so it weighs more than any single description word
+        query = " ".join([business_description] + [industry or ""] * 2 + list(keywords or []))
+        results = index.search(query, k=5)
+        return {
+            "similar_startups": [record for _, record in results],
+            "detected_industry": industry or "Not specified"
+        }
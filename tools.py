@@ -0,0 +1,239 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Longest time a single tool call may take before the run gets an error for it
+TOOL_TIMEOUT = 20
+# How long successful tool results are reused for identical calls
+TOOL_CACHE_TTL = 60 * 60
+# Tool calls running at the same time across all runs in the process
+TOOL_WORKERS = 8
+
+# Function tools offered to the assistant, see create_assistant
+FUNCTION_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "find_linkedin_profiles",
+            "description": "Find LinkedIn profiles for startup team members based on their names and company details",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "team_members": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "name": {
+                                    "type": "string",
+                                    "description": "Full name of the team member"
+                                },
+                                "role": {
+                                    "type": "string",
+                                    "description": "Role or title of the team member"
+                                },
+                                "company": {
+                                    "type": "string",
+                                    "description": "Company or startup name"
+                                }
+                            }
+                        },
+                        "description": "List of team members to find LinkedIn profiles for"
+                    }
+                },
+                "required": ["team_members"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_similar_startups",
+            "description": "Find similar startups based on the business description and industry",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "business_description": {
+                        "type": "string",
+                        "description": "Brief description of the startup's business model or product"
+                    },
+                    "industry": {
+                        "type": "string",
+                        "description": "Industry or sector of the startup"
+                    },
+                    "keywords": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Keywords related to the startup's product or service"
+                    }
+                },
+                "required": ["business_description"]
+            }
+        }
+    }
+]
+
+# Function name -> implementation, filled in by register_tool
+TOOL_REGISTRY = {}
+
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+def register_tool(name):
+    """Register the decorated function as the implementation of a function tool"""
+    def decorator(func):
+        TOOL_REGISTRY[name] = func
+        return func
+    return decorator
+
+def normalize_arguments(value):
+    """Normalize tool arguments so equivalent calls share a cache entry"""
+    if isinstance(value, dict):
+        return {key: normalize_arguments(item) for key, item in sorted(value.items())}
+    if isinstance(value, list):
+        return [normalize_arguments(item) for item in value]
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+class ToolResultCache:
+    """Thread-safe cache of tool results keyed by function name and normalized arguments"""
+
+    def __init__(self, ttl=TOOL_CACHE_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def key(self, function_name, function_args):
+        return function_name, json.dumps(normalize_arguments(function_args))
+
+    def get(self, function_name, function_args):
+        key = self.key(function_name, function_args)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                return None
+            return entry[1]
+
+    def put(self, function_name, function_args, result):
+        with self.lock:
+            self.entries[self.key(function_name, function_args)] = (time.monotonic(), result)
+
+tool_cache = ToolResultCache()
+
+def call_tool(function_name, function_args):
+    """Run one function tool, serving repeated calls from the result cache"""
+    result = tool_cache.get(function_name, function_args)
+    if result is not None:
+        return result
+
+    implementation = TOOL_REGISTRY.get(function_name)
+    if implementation is None:
+        return {"error": "Function not implemented"}
+
+    result = implementation(**function_args)
+    if "error" not in result:
+        tool_cache.put(function_name, function_args, result)
+    return result
+
+def run_tool_calls(tool_calls, timeout=TOOL_TIMEOUT):
+    """Run all tool calls of a run concurrently and build the outputs to submit back
+
+    Each call gets its own timeout; a call that fails or times out returns an error
+    output instead of failing the whole submission.
+    """
+    futures = []
+    for tool_call in tool_calls:
+        try:
+            function_args = json.loads(tool_call.function.arguments or "{}")
+        except json.JSONDecodeError as e:
+            futures.append((tool_call, None, f"Invalid arguments: {e}"))
+            continue
+        futures.append((tool_call, tool_executor.submit(call_tool, tool_call.function.name, function_args), None))
+
+    # All calls started together, so each deadline is measured from the same moment
+    deadline = time.monotonic() + timeout
+    tool_outputs = []
+    for tool_call, future, error in futures:
+        if future is not None:
+            try:
+                result = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                result = {"error": f"{tool_call.function.name} timed out after {timeout} seconds"}
+            except Exception as e:
+                print(f"Error in function {tool_call.function.name}: {e}")
+                result = {"error": f"Error in {tool_call.function.name}: {e}"}
+        else:
+            result = {"error": error}
+
+        tool_outputs.append({
+            "tool_call_id": tool_call.id,
+            "output": json.dumps(result)
+        })
+    return tool_outputs
+
+# Offline stand-in backends, so the function calling path works without external APIs
+
+@register_tool("find_linkedin_profiles")
+def find_linkedin_profiles(team_members):
+    """Build placeholder profile entries for the team members (no external lookup)"""
+    profiles = []
+    for member in team_members:
+        name = member.get("name", "").strip()
+        if not name:
+            continue
+        profiles.append({
+            "name": name,
+            "role": member.get("role", "").strip(),
+            "company": member.get("company", "").strip(),
+            "linkedin_url": f"https://linkedin.com/in/{name.lower().replace(' ', '-')}",
+            "profile_summary": "Profile not verified - this is a placeholder URL",
+            "note": "Offline lookup, no profile search was made."
+        })
+    return {"profiles": profiles}
+
+# Small built-in catalogue used when no startup search backend is configured
+SAMPLE_STARTUPS = [
+    {"name": "Stripe", "industry": "Fintech", "description": "Online payment processing APIs for internet businesses"},
+    {"name": "Plaid", "industry": "Fintech", "description": "API connecting apps to users' bank accounts"},
+    {"name": "Revolut", "industry": "Fintech", "description": "Mobile banking app with currency exchange and cards"},
+    {"name": "Airbnb", "industry": "Travel", "description": "Marketplace for short-term home and room rentals"},
+    {"name": "Flexport", "industry": "Logistics", "description": "Digital freight forwarding and supply chain platform"},
+    {"name": "Instacart", "industry": "Retail", "description": "Online grocery delivery marketplace"},
+    {"name": "Doctolib", "industry": "Healthcare", "description": "Online doctor appointment booking and telehealth"},
+    {"name": "Oscar Health", "industry": "Healthcare", "description": "Technology-driven health insurance"},
+    {"name": "Duolingo", "industry": "Education", "description": "Gamified mobile language learning app"},
+    {"name": "Coursera", "industry": "Education", "description": "Online courses and degrees from universities"},
+    {"name": "Notion", "industry": "Software", "description": "Collaborative workspace for notes, docs and project management"},
+    {"name": "Figma", "industry": "Software", "description": "Browser-based collaborative design tool"},
+    {"name": "Snowflake", "industry": "Software", "description": "Cloud data warehouse and analytics platform"},
+    {"name": "Northvolt", "industry": "Energy", "description": "Lithium-ion battery manufacturing for electric vehicles"},
+    {"name": "Octopus Energy", "industry": "Energy", "description": "Renewable electricity supplier with smart tariffs"},
+    {"name": "Too Good To Go", "industry": "Food", "description": "App selling surplus food from restaurants and shops to reduce waste"},
+]
+
+def tokenize(text):
+    """Split text into lowercase words, ignoring short filler words"""
+    return set(re.findall(r"[a-z0-9]{4,}", text.lower()))
+
+@register_tool("find_similar_startups")
+def find_similar_startups(business_description, industry=None, keywords=None):
+    """Rank the built-in startup catalogue by word overlap with the description"""
+    query = tokenize(" ".join([business_description, industry or ""] + list(keywords or [])))
+    scored = []
+    for startup in SAMPLE_STARTUPS:
+        score = len(query & tokenize(f"{startup['industry']} {startup['description']}"))
+        if industry and industry.lower() == startup["industry"].lower():
+            score += 2
+        if score:
+            scored.append((score, startup))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return {
+        "similar_startups": [startup for _, startup in scored[:5]],
+        "detected_industry": industry or "Not specified",
+        "note": "Results come from a small offline sample catalogue."
+    }
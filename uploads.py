@@ -0,0 +1,304 @@
+import hashlib
+import json
+import math
+import mimetypes
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import openai
+from utils import write_json_atomic
+
+# Indexed uploads older than this are dropped and the file is uploaded again
+UPLOAD_MAX_AGE = 30 * 24 * 60 * 60
+# How long an indexed upload is trusted before it is checked against the API again
+UPLOAD_VALIDATE_TTL = 24 * 60 * 60
+# Number of files uploaded at the same time
+UPLOAD_WORKERS = 4
+# Files larger than this are sent in parts through the Uploads API, smaller ones in one request
+MULTIPART_THRESHOLD = 32 * 1024 * 1024
+# Size of each part (the API accepts up to 64 MB)
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+# Parts of one file sent at the same time
+UPLOAD_PART_WORKERS = 4
+# Unfinished uploads expire an hour after they were created; one about to expire is started over
+UPLOAD_RESUME_MARGIN = 5 * 60
+
+def hash_content(data):
+    """Return the SHA-256 hex digest used to identify a file's content"""
+    return hashlib.sha256(data).hexdigest()
+
+@contextmanager
+def file_view(file):
+    """A read-only memoryview of a file object's content, without reading it into memory
+
+    Files on disk are memory-mapped; in-memory buffers (like Streamlit uploads) are
+    viewed in place.
+    """
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    try:
+        fileno = file.fileno()
+    except (AttributeError, OSError):
+        fileno = None
+
+    if fileno is not None and size:
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+    else:
+        view = memoryview(file.getbuffer() if hasattr(file, "getbuffer") else file.read())
+        try:
+            yield view
+        finally:
+            view.release()
+            file.seek(0)
+
+def hash_file(file):
+    """hash_content of a file object, computed from a view of it rather than a copy"""
+    with file_view(file) as view:
+        return hash_content(view)
+
+class JSONStore:
+    """A dict persisted as one JSON file, shared by every session in the process"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+    def load(self):
+        """Read the file, starting empty if it is missing or unreadable"""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error reading {os.path.basename(self.path)}: {e}")
+            return {}
+
+    def save(self):
+        write_json_atomic(self.path, self.entries)
+
+class UploadCheckpoint(JSONStore):
+    """Part ids of unfinished multipart uploads by content hash, so an interrupted upload resumes"""
+
+    def get(self, digest, size, part_size):
+        """The unfinished upload of this content, or None if there is none that can be resumed"""
+        with self.lock:
+            entry = self.entries.get(digest)
+        if entry is None:
+            return None
+        if entry["size"] != size or entry["part_size"] != part_size or entry["expires_at"] - time.time() < UPLOAD_RESUME_MARGIN:
+            self.discard(digest)
+            return None
+        return entry
+
+    def start(self, digest, upload_id, size, part_size, expires_at):
+        entry = {"upload_id": upload_id, "size": size, "part_size": part_size, "expires_at": expires_at, "parts": {}}
+        with self.lock:
+            self.entries[digest] = entry
+            self.save()
+        return entry
+
+    def add_part(self, digest, upload_id, number, part_id):
+        """Record a part sent, unless its upload has since been replaced by another one"""
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None and entry["upload_id"] == upload_id:
+                entry["parts"][str(number)] = part_id
+                self.save()
+
+    def discard(self, digest, upload_id=None):
+        """Forget the unfinished upload of this content, only if it is upload_id when given"""
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None and upload_id in (None, entry["upload_id"]):
+                del self.entries[digest]
+                self.save()
+
+class UploadIndex(JSONStore):
+    """Persistent map from the SHA-256 of a file's content to its OpenAI file id"""
+
+    def __init__(self, path, max_age=UPLOAD_MAX_AGE, validate_ttl=UPLOAD_VALIDATE_TTL, checkpoint_path=None):
+        super().__init__(path)
+        self.max_age = max_age
+        self.validate_ttl = validate_ttl
+        # Unfinished multipart uploads are kept next to the index
+        self.checkpoint = UploadCheckpoint(checkpoint_path or f"{os.path.splitext(path)[0]}_parts.json")
+        # Content hash -> (lock, number of uploads holding or waiting for it)
+        self.upload_locks = {}
+
+    @contextmanager
+    def uploading(self, digest):
+        """Hold the upload of this content, so two sessions never upload the same file at once"""
+        with self.lock:
+            lock, users = self.upload_locks.get(digest, (threading.Lock(), 0))
+            self.upload_locks[digest] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.lock:
+                lock, users = self.upload_locks[digest]
+                if users == 1:
+                    del self.upload_locks[digest]
+                else:
+                    self.upload_locks[digest] = (lock, users - 1)
+
+    def get(self, client, digest):
+        """Return the file id already uploaded for this content, or None if it must be uploaded"""
+        with self.lock:
+            entry = self.entries.get(digest)
+        if entry is None:
+            return None
+
+        now = time.time()
+        if now - entry["uploaded_at"] > self.max_age:
+            self.discard(digest)
+            return None
+
+        # Make sure the remote file has not been deleted since it was last seen
+        if now - entry["validated_at"] > self.validate_ttl:
+            try:
+                client.files.retrieve(entry["file_id"])
+            except Exception as e:
+                print(f"Indexed upload {entry['file_id']} is no longer available: {e}")
+                self.discard(digest)
+                return None
+            with self.lock:
+                entry["validated_at"] = now
+                self.save()
+
+        return entry["file_id"]
+
+    def put(self, digest, file_id, file_name, size):
+        """Record a completed upload"""
+        now = time.time()
+        with self.lock:
+            self.entries[digest] = {
+                "file_id": file_id,
+                "file_name": file_name,
+                "size": size,
+                "uploaded_at": now,
+                "validated_at": now
+            }
+            self.save()
+
+    def discard(self, digest):
+        """Forget an upload that has expired or failed validation"""
+        with self.lock:
+            if self.entries.pop(digest, None) is not None:
+                self.save()
+
+def upload_parts(client, checkpoint, file_name, file, digest, size, part_size=UPLOAD_PART_SIZE,
+                 max_workers=UPLOAD_PART_WORKERS):
+    """Upload a large file in parts sent in parallel, resuming an unfinished upload of the same content
+
+    Every part sent is checkpointed, so after an interruption only the missing parts are
+    sent again. Returns the id of the uploaded file.
+    """
+    entry = checkpoint.get(digest, size, part_size)
+    resumed = entry is not None
+    if resumed:
+        print(f"Resuming upload of {file_name}, {len(entry['parts'])} parts already sent")
+    else:
+        upload = client.uploads.create(
+            bytes=size,
+            filename=file_name,
+            mime_type=mimetypes.guess_type(file_name)[0] or "application/octet-stream",
+            purpose="assistants"
+        )
+        entry = checkpoint.start(digest, upload.id, size, part_size, upload.expires_at)
+
+    upload_id = entry["upload_id"]
+    # This upload's own parts, which the checkpoint only records while the upload is current
+    parts = dict(entry["parts"])
+    count = math.ceil(size / part_size)
+    missing = [number for number in range(count) if str(number) not in parts]
+
+    def send(view, number):
+        # Only the part being sent is copied out of the file
+        data = bytes(view[number * part_size:(number + 1) * part_size])
+        part = client.uploads.parts.create(upload_id, data=data)
+        parts[str(number)] = part.id
+        checkpoint.add_part(digest, upload_id, number, part.id)
+
+    try:
+        with file_view(file) as view, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(send, view, number) for number in missing]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException:
+                # The parts already sent stay checkpointed for the next attempt
+                executor.shutdown(cancel_futures=True)
+                raise
+        completed = client.uploads.complete(upload_id, part_ids=[parts[str(number)] for number in range(count)])
+    except openai.APIStatusError as e:
+        if e.status_code >= 500 or e.status_code == 429:
+            raise
+        # The upload was rejected, cancelled or has expired, it can't be finished
+        checkpoint.discard(digest, upload_id)
+        if not resumed:
+            raise
+        print(f"Could not resume upload of {file_name}, starting over: {e}")
+        return upload_parts(client, checkpoint, file_name, file, digest, size, part_size, max_workers)
+    checkpoint.discard(digest, upload_id)
+    return completed.file.id
+
+def upload_file(client, index, file_name, file, digest):
+    """Upload a file object's content unless the same content is already indexed
+
+    Returns the file id and whether an earlier upload was reused.
+    """
+    file_id = index.get(client, digest)
+    if file_id:
+        return file_id, True
+
+    with index.uploading(digest):
+        # Another session may have uploaded the same content while this one waited
+        file_id = index.get(client, digest)
+        if file_id:
+            return file_id, True
+
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(0)
+        if size > MULTIPART_THRESHOLD:
+            file_id = upload_parts(client, index.checkpoint, file_name, file, digest, size)
+        else:
+            # Send the file object as is, nothing is copied or written to disk
+            file_id = client.files.create(
+                file=(file_name, file),
+                purpose="assistants"
+            ).id
+        file.seek(0)
+        index.put(digest, file_id, file_name, size)
+    return file_id, False
+
+def upload_files(client, index, files, max_workers=UPLOAD_WORKERS):
+    """Upload (file_name, file, digest) items concurrently
+
+    Yields (file_name, digest, file_id, reused, error) for each file as soon as it finishes,
+    so the caller can report progress. error is None on success.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(upload_file, client, index, file_name, file, digest): (file_name, digest)
+            for file_name, file, digest in files
+        }
+        for future in as_completed(futures):
+            file_name, digest = futures[future]
+            try:
+                file_id, reused = future.result()
+                yield file_name, digest, file_id, reused, None
+            except Exception as e:
+                yield file_name, digest, None, False, e
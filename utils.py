@@ -1,75 +1,86 @@
+import json
+import os
+import threading
 import time
+import random
 from openai import OpenAI
-import json
-def create_assistant(client):
-    """Create a new assistant"""
-    function_tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "find_linkedin_profiles",
-                "description": "Find LinkedIn profiles for startup team members based on their names and company details",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "team_members": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "name": {
-                                        "type": "string",
-                                        "description": "Full name of the team member"
-                                    },
-                                    "role": {
-                                        "type": "string",
-                                        "description": "Role or title of the team member"
-                                    },
-                                    "company": {
-                                        "type": "string",
-                                        "description": "Company or startup name"
-                                    }
-                                }
-                            },
-                            "description": "List of team members to find LinkedIn profiles for"
-                        }
-                    },
-                    "required": ["team_members"]
-                }
-            }
-         }
-         ,
-        {
-            "type": "function",
-            "function": {
-                "name": "find_similar_startups",
-                "description": "Find similar startups based on the business description and industry",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "business_description": {
-                            "type": "string",
-                            "description": "Brief description of the startup's business model or product"
-                        },
-                        "industry": {
-                            "type": "string",
-                            "description": "Industry or sector of the startup"
-                        },
-                        "keywords": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "Keywords related to the startup's product or service"
-                        }
-                    },
-                    "required": ["business_description"]
-                }
-            }
-        }
-    ]
+from tools import FUNCTION_TOOLS, run_tool_calls
+
+# Run statuses that mean the run is still being worked on
+ACTIVE_RUN_STATUSES = ["queued", "in_progress", "cancelling"]
+
+def write_json_atomic(path, data):
+    """Write a JSON file atomically so concurrent sessions never see a partial file"""
+    # Sessions run in threads of one process, each needs its own temporary file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+def backoff_intervals(initial=0.25, maximum=5.0, factor=1.6, jitter=0.2):
+    """Yield polling intervals that start fast and grow for long waits, with random jitter"""
+    interval = initial
+    while True:
+        # Jitter keeps concurrent sessions from polling in lockstep
+        yield interval * random.uniform(1 - jitter, 1 + jitter)
+        interval = min(interval * factor, maximum)
+
+class RunWatcher:
+    """Track a single run by id until it needs attention or finishes"""
     
-    assistant = client.beta.assistants.create(
-        name="VC Assistant",
-        instructions="""
+    def __init__(self, client, thread_id, run_id, timeout=600, on_status=None,
+                 initial_interval=0.25, max_interval=5.0):
+        self.client = client
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.deadline = time.monotonic() + timeout
+        self.on_status = on_status
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.status = None
+        self.polls = 0
+    
+    def poll(self):
+        """Retrieve the run once and report a status transition"""
+        run = self.client.beta.threads.runs.retrieve(
+            thread_id=self.thread_id,
+            run_id=self.run_id
+        )
+        self.polls += 1
+        return self.observe(run)
+    
+    def observe(self, run):
+        """Record a run object and notify the callback when its status changes"""
+        if run.status != self.status:
+            self.status = run.status
+            if self.on_status:
+                self.on_status(run)
+        return run
+    
+    def intervals(self):
+        """Yield the pauses between polls of one wait, ending when the deadline passes"""
+        for interval in backoff_intervals(self.initial_interval, self.max_interval):
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            yield min(interval, remaining)
+    
+    def wait(self, run=None):
+        """Poll with backoff until the run leaves the active statuses or the deadline passes
+        
+        Returns the last retrieved run; its status is still active if the deadline passed.
+        Each call restarts the backoff, so waiting again after submitting tool outputs is fast.
+        """
+        run = self.poll() if run is None else self.observe(run)
+        for interval in self.intervals():
+            if run.status not in ACTIVE_RUN_STATUSES:
+                break
+            time.sleep(interval)
+            run = self.poll()
+        return run
+
+ASSISTANT_MODEL = "gpt-3.5-turbo"
+ASSISTANT_INSTRUCTIONS = """
         You are a venture capitalist evaluating startup proposals.
         Analyze business ideas, provide constructive feedback, and score them on a scale of 1-10.
         Consider factors like market potential, innovation, team, business model, and scalability.
@@ -101,33 +112,67 @@ def create_assistant(client):
         - Experience Summary
         - Contact Details from CV
         Include as many rows as there are team members, and be as thorough as possible.
-        """,
-        model="gpt-3.5-turbo",  # Use GPT-4o for better function calling capabilities
+        """
+
+def create_assistant(client, function_tools=(), **options):
+    """Create a new assistant, the full VC evaluator unless options override its settings
+
+    function_tools names the FUNCTION_TOOLS schemas added to its tools, for the functions
+    that have an implementation.
+    """
+    settings = dict(
+        name="VC Assistant",
+        instructions=ASSISTANT_INSTRUCTIONS,
+        model=ASSISTANT_MODEL,  # Use GPT-4o for better function calling capabilities
         tools=[
             {"type": "file_search"},
             {"type": "code_interpreter"}
-        ], #+ function_tools,
+        ],
         temperature=0.2,  # Lower for more consistent/reliable outputs
         top_p=0.9        # Slightly constrained but allows some flexibility
     )
+    settings.update(options)
+    settings["tools"] = list(settings["tools"]) + [
+        tool for tool in FUNCTION_TOOLS if tool["function"]["name"] in function_tools
+    ]
+    assistant = client.beta.assistants.create(**settings)
     
     return assistant.id
 
+def function_tool_names(assistant):
+    """Names of the function tools an existing assistant was created with"""
+    return {tool.function.name for tool in assistant.tools or [] if tool.type == "function"}
+
 def create_thread(client):
     """Create a new thread for conversation"""
     thread = client.beta.threads.create()
     return thread.id
 
-def create_message(client, thread_id, content):
-    """Add a user message to a thread"""
+def create_message(client, thread_id, content, role="user", metadata=None):
+    """Add a message to a thread"""
     message = client.beta.threads.messages.create(
         thread_id=thread_id,
-        role="user",
-        content=content
+        role=role,
+        content=content,
+        **({"metadata": metadata} if metadata else {})
     )
     return message.id
 
-def get_response(client, thread_id, assistant_id):
+def get_message_text(message):
+    """Concatenate the text parts of a thread message"""
+    return "".join(part.text.value for part in message.content if part.type == "text")
+
+def run_options(instructions=None, truncation_strategy=None):
+    """Optional arguments of runs.create that were given"""
+    options = {}
+    if instructions:
+        options["instructions"] = instructions
+    if truncation_strategy:
+        options["truncation_strategy"] = truncation_strategy
+    return options
+
+def get_response(client, thread_id, assistant_id, timeout=600, on_status=None, instructions=None,
+                 truncation_strategy=None):
     """Create a run and wait for completion to get assistant's response"""
     # First check if a run already exists
     runs = client.beta.threads.runs.list(thread_id=thread_id)
@@ -137,15 +182,15 @@ def get_response(client, thread_id, assistant_id):
         # Create a new run only if needed
         run = client.beta.threads.runs.create(
             thread_id=thread_id,
-            assistant_id=assistant_id
+            assistant_id=assistant_id,
+            **run_options(instructions, truncation_strategy)
         )
     
-    # Poll for run completion or function calls
+    # Watch the run until it completes or needs function calls
+    watcher = RunWatcher(client, thread_id, run.id, timeout=timeout, on_status=on_status)
+    run_status = run
     while True:
-        run_status = client.beta.threads.runs.retrieve(
-            thread_id=thread_id,
-            run_id=run.id
-        )
+        run_status = watcher.wait(run_status)
         
         if run_status.status == "completed":
             # Get messages
@@ -155,192 +200,17 @@ def get_response(client, thread_id, assistant_id):
             # Return the latest assistant message
             for message in messages.data:
                 if message.role == "assistant" and message.run_id == run.id:
-                    # Extract content from message parts
-                    content = ""
-                    for part in message.content:
-                        if part.type == "text":
-                            content += part.text.value
-                    return content
+                    return get_message_text(message)
             
             return "No response found."
         
         elif run_status.status == "requires_action":
             # Handle function calling
             try:
-                tool_calls = run_status.required_action.submit_tool_outputs.tool_calls
-                tool_outputs = []
-                
-                for tool_call in tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
-                    
-                    
-                    
-                    # if function_name == "find_linkedin_profiles":
-                    #     def find_linkedin_profiles_impl(team_members):
-                    #         import requests
-                    #         import os
-                            
-                    #         # Get API key from environment variable
-                    #         api_key = os.environ.get("LINKEDIN_API_KEY")
-                    #         if not api_key:
-                    #             return {"error": "LinkedIn API key not configured", "profiles": []}
-                            
-                    #         profiles = []
-                            
-                    #         for member in team_members:
-                    #             name = member.get("name", "").strip()
-                    #             role = member.get("role", "").strip()
-                    #             company = member.get("company", "").strip()
-                                
-                    #             if not name:
-                    #                 continue
-                                    
-                    #             try:
-                    #                 # Using a service like People Data Labs, Apollo.io, or Hunter.io
-                    #                 # This is an example with a hypothetical API
-                    #                 url = "https://api.peopledatalabs.com/v5/person/search"
-                    #                 headers = {
-                    #                     "X-API-Key": api_key,
-                    #                     "Content-Type": "application/json"
-                    #                 }
-                    #                 payload = {
-                    #                     "name": name,
-                    #                     "company": company,
-                    #                     "title": role,
-                    #                     "include_linkedin_url": True
-                    #                 }
-                                    
-                    #                 response = requests.post(url, json=payload, headers=headers)
-                    #                 data = response.json()
-                                    
-                    #                 if data.get("status") == 200 and data.get("data"):
-                    #                     person = data["data"][0]  # Get first match
-                    #                     profiles.append({
-                    #                         "name": name,
-                    #                         "role": role,
-                    #                         "company": company,
-                    #                         "linkedin_url": person.get("linkedin_url", ""),
-                    #                         "profile_summary": person.get("bio", "No bio available"),
-                    #                         "experience": person.get("experience", [])
-                    #                     })
-                    #                 else:
-                    #                     # Fallback to simulated data
-                    #                     profiles.append({
-                    #                         "name": name,
-                    #                         "role": role,
-                    #                         "company": company,
-                    #                         "linkedin_url": f"https://linkedin.com/in/{name.lower().replace(' ', '-')}",
-                    #                         "profile_summary": "Profile not found - this is a placeholder URL",
-                    #                         "note": "Real API search returned no results."
-                    #                     })
-                                        
-                    #             except Exception as e:
-                    #                 # Error handling with fallback
-                    #                 print(f"Error searching for {name}: {e}")
-                    #                 profiles.append({
-                    #                     "name": name,
-                    #                     "role": role,
-                    #                     "company": company,
-                    #                     "linkedin_url": "#",
-                    #                     "profile_summary": f"Error retrieving profile: {str(e)}",
-                    #                     "note": "API error occurred."
-                    #                 })
-                            
-                    #         return {"profiles": profiles}
-                        
-                    #     team_members = function_args.get("team_members", [])
-                    #     result = find_linkedin_profiles_impl(team_members)
-                        
-                    # elif function_name == "find_similar_startups":
-                    #     def find_similar_startups_impl(business_description, industry=None, keywords=None):
-                    #         # Get API key from environment variable
-                    #         api_key = os.environ.get("CRUNCHBASE_API_KEY")
-                    #         if not api_key:
-                    #             return {"error": "Crunchbase API key not configured", "similar_startups": []}
-                            
-                    #         import requests
-                    #         import os
-                            
-                    #         try:
-                    #             # Build query from industry and keywords
-                    #             query = industry if industry else ""
-                    #             if keywords:
-                    #                 query += " " + " ".join(keywords)
-                    #             if not query and business_description:
-                    #                 # Extract key terms from business description
-                    #                 import re
-                    #                 # Simple extraction of nouns over 4 letters
-                    #                 words = re.findall(r'\b[A-Za-z]{4,}\b', business_description)
-                    #                 query = " ".join(words[:5])  # Take first 5 words
-                                
-                    #             # Using Crunchbase API
-                    #             url = "https://api.crunchbase.com/api/v4/searches/organizations"
-                    #             headers = {
-                    #                 "X-CB-USER-KEY": api_key,
-                    #                 "Content-Type": "application/json"
-                    #             }
-                    #             payload = {
-                    #                 "field_ids": ["name", "short_description", "website_url", "categories"],
-                    #                 "query": [
-                    #                     {
-                    #                         "type": "predicate",
-                    #                         "field_id": "facet_ids",
-                    #                         "operator_id": "includes",
-                    #                         "values": ["company"]
-                    #                     },
-                    #                     {
-                    #                         "type": "predicate", 
-                    #                         "field_id": "description",
-                    #                         "operator_id": "contains",
-                    #                         "values": [query]
-                    #                     }
-                    #                 ],
-                    #                 "limit": 5
-                    #             }
-                                
-                    #             response = requests.post(url, json=payload, headers=headers)
-                    #             data = response.json()
-                                
-                    #             startups = []
-                    #             if "entities" in data:
-                    #                 for entity in data["entities"]:
-                    #                     properties = entity.get("properties", {})
-                    #                     startups.append({
-                    #                         "name": properties.get("name", "Unknown"),
-                    #                         "website": properties.get("website_url", "#"),
-                    #                         "description": properties.get("short_description", "No description available"),
-                    #                         "categories": properties.get("categories", [])
-                    #                     })
-                                    
-                    #                 return {
-                    #                     "similar_startups": startups,
-                    #                     "detected_industry": industry or "Based on query: " + query
-                    #                 }
-                    #             else:
-                    #                 # Fallback to our mock implementation if API fails
-                    #                 return print(f"Error finding similar startups: {e}") #find_similar_startups_mock(business_description, industry, keywords)                                    
-                    #         except Exception as e:
-                    #             # print(f"Error finding similar startups: {e}")
-                    #             # Fallback to mock implementation
-                    #             return {"error": f"Error finding similar startups: {str(e)}", "similar_startups": []}
-                            
-
-                    #     business_description = function_args.get("business_description", "")
-                    #     industry = function_args.get("industry", None)
-                    #     keywords = function_args.get("keywords", [])
-                    #     result = find_similar_startups_impl(business_description, industry, keywords)
-                        
-                    # else:
-                    result = {"error": "Function not implemented"}
-                    
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": json.dumps(result)
-                    })
+                tool_outputs = run_tool_calls(run_status.required_action.submit_tool_outputs.tool_calls)
                 
                 # Submit the outputs back
-                client.beta.threads.runs.submit_tool_outputs(
+                run_status = client.beta.threads.runs.submit_tool_outputs(
                     thread_id=thread_id,
                     run_id=run.id,
                     tool_outputs=tool_outputs
@@ -349,8 +219,77 @@ def get_response(client, thread_id, assistant_id):
                 print(f"Error in function calling: {e}")
                 return f"Error in processing functions: {e}"
             
-        elif run_status.status in ["failed", "expired", "cancelled"]:
-            return f"Error: Run ended with status {run_status.status}"
+        elif run_status.status in ACTIVE_RUN_STATUSES:
+            return f"Error: Timed out waiting for run {run.id} ({run_status.status})"
         
-        time.sleep(1)  # Avoid rate limiting
+        else:
+            return f"Error: Run ended with status {run_status.status}"
+
+# Stream events that end a run without an answer
+RUN_ERROR_EVENTS = ["thread.run.failed", "thread.run.expired", "thread.run.cancelled"]
 
+def read_stream_event(event):
+    """What a run stream event means for the reader, shared by the sync and async streams
+
+    Returns ("text", delta), ("error", message), ("requires_action", run) or (None, None).
+    """
+    if event.event == "thread.message.delta":
+        text = "".join(part.text.value for part in event.data.delta.content or []
+                       if part.type == "text" and part.text and part.text.value)
+        return ("text", text) if text else (None, None)
+    if event.event == "thread.run.requires_action":
+        return "requires_action", event.data
+    if event.event in RUN_ERROR_EVENTS:
+        return "error", f"Error: Run ended with status {event.data.status}"
+    if event.event == "error":
+        return "error", f"Error: {event.data.message}"
+    return None, None
+
+def tool_error(error, on_error=None):
+    """Report a failure to run a stream's tool calls, returning the text to yield"""
+    print(f"Error in function calling: {error}")
+    message = f"Error in processing functions: {error}"
+    if on_error:
+        on_error(message)
+    return message
+
+def stream_response(client, thread_id, assistant_id, instructions=None, on_error=None, truncation_strategy=None):
+    """Create a streaming run and yield the assistant's text deltas as they arrive
+    
+    Errors are yielded as text too; on_error is also called with each error message.
+    """
+    stream = client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        stream=True,
+        **run_options(instructions, truncation_strategy)
+    )
+    
+    # Each tool output submission continues the run on a new event stream
+    while stream is not None:
+        next_stream = None
+        with stream:
+            for event in stream:
+                kind, value = read_stream_event(event)
+                if kind == "text":
+                    yield value
+                
+                elif kind == "requires_action":
+                    # Handle function calling without leaving the stream
+                    try:
+                        tool_outputs = run_tool_calls(value.required_action.submit_tool_outputs.tool_calls)
+                        next_stream = client.beta.threads.runs.submit_tool_outputs(
+                            thread_id=thread_id,
+                            run_id=value.id,
+                            tool_outputs=tool_outputs,
+                            stream=True
+                        )
+                    except Exception as e:
+                        yield tool_error(e, on_error)
+                    break
+                
+                elif kind == "error":
+                    if on_error:
+                        on_error(value)
+                    yield value
+        stream = next_stream
@@ -0,0 +1,87 @@
+import time
+from utils import backoff_intervals
+
+# Longest time to wait for a batch of files to be indexed
+INDEXING_TIMEOUT = 300
+# Vector stores are removed after this many days without use
+VECTOR_STORE_EXPIRY_DAYS = 7
+
+class ThreadVectorStore:
+    """The file_search vector store of one conversation thread
+
+    Files are indexed once per conversation, so follow-up questions reuse them.
+    """
+
+    def __init__(self, client, thread_id):
+        self.client = client
+        self.thread_id = thread_id
+        self.vector_store_id = None
+        # Files that finished indexing in this vector store
+        self.file_ids = set()
+
+    def ensure(self):
+        """Return the thread's vector store id, attaching a new vector store if it has none"""
+        if self.vector_store_id:
+            return self.vector_store_id
+
+        # A restored conversation may already have a vector store
+        thread = self.client.beta.threads.retrieve(self.thread_id)
+        file_search = thread.tool_resources.file_search if thread.tool_resources else None
+        if file_search and file_search.vector_store_ids:
+            self.vector_store_id = file_search.vector_store_ids[0]
+            for vector_store_file in self.client.vector_stores.files.list(
+                vector_store_id=self.vector_store_id,
+                filter="completed"
+            ):
+                self.file_ids.add(vector_store_file.id)
+            return self.vector_store_id
+
+        vector_store = self.client.vector_stores.create(
+            name=f"VC Assistant {self.thread_id}",
+            expires_after={"anchor": "last_active_at", "days": VECTOR_STORE_EXPIRY_DAYS}
+        )
+        self.client.beta.threads.update(
+            self.thread_id,
+            tool_resources={"file_search": {"vector_store_ids": [vector_store.id]}}
+        )
+        self.vector_store_id = vector_store.id
+        return self.vector_store_id
+
+    def add_files(self, file_ids, timeout=INDEXING_TIMEOUT, on_status=None):
+        """Index the files that are not in the vector store yet and wait until they are searchable
+
+        Returns the finished file batch, or None if every file was already indexed.
+        The batch status is still "in_progress" if the timeout passed.
+        """
+        new_file_ids = [file_id for file_id in file_ids if file_id not in self.file_ids]
+        if not new_file_ids:
+            return None
+
+        batch = self.client.vector_stores.file_batches.create(
+            self.ensure(),
+            file_ids=new_file_ids
+        )
+
+        # Poll the real ingestion status with the same backoff as run polling
+        deadline = time.monotonic() + timeout
+        intervals = backoff_intervals()
+        while batch.status == "in_progress" and time.monotonic() < deadline:
+            if on_status:
+                on_status(batch)
+            time.sleep(min(next(intervals), max(deadline - time.monotonic(), 0)))
+            batch = self.client.vector_stores.file_batches.retrieve(
+                batch.id,
+                vector_store_id=self.vector_store_id
+            )
+
+        if batch.status == "completed" and not batch.file_counts.failed:
+            self.file_ids.update(new_file_ids)
+        elif batch.status == "completed":
+            # Only remember the files that were indexed successfully
+            for vector_store_file in self.client.vector_stores.file_batches.list_files(
+                batch.id,
+                vector_store_id=self.vector_store_id,
+                filter="completed"
+            ):
+                self.file_ids.add(vector_store_file.id)
+        return batch
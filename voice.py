@@ -0,0 +1,15 @@
+import streamlit as st
+
+def transcribe_speech():
+    """Record one phrase from the microphone and transcribe it
+
+    speech_recognition (and PyAudio/PortAudio behind it) is imported on first use,
+    so sessions that never record don't pay for loading the audio stack.
+    """
+    import speech_recognition as sr
+
+    r = sr.Recognizer()
+    with sr.Microphone() as source:
+        st.write("Speak something...")
+        audio_data = r.listen(source)
+        return r.recognize_google(audio_data)